@@ -0,0 +1,58 @@
+import argparse
+import pigpio
+import time
+from typing import List, Sequence, Tuple
+
+from robot.hardware.linear_actuator import (
+    ActuatorModel,
+    LinearActuator,
+    fit_actuator_model,
+    save_actuator_model
+)
+from robot.utils.init import actuator_model_path, linear_actuator_pwm_pin
+
+
+def calibrate_actuator(
+        distances: Sequence[int],
+        trials: int,
+        settle_time: float) -> ActuatorModel:
+    """Time moves out from fully retracted and fit the actuator travel
+    model to them, saving it for run_course. The operator presses enter
+    when the actuator stops, so reaction time ends up in the dead time,
+    which keeps the model on the safe side."""
+    pi = pigpio.pi()
+    actuator = LinearActuator(pi, linear_actuator_pwm_pin, 1000)
+    samples: List[Tuple[float, float]] = []
+    try:
+        for distance in distances:
+            for _ in range(trials):
+                actuator.set_extension_minimum()
+                time.sleep(settle_time)
+                input('[?] Press enter to extend to {}, then again once it '
+                      'stops '.format(distance))
+                start = time.monotonic()
+                actuator.set_extension_pwm(distance)
+                input()
+                seconds = time.monotonic() - start
+                print('[*] {} counts in {:.2f} s'.format(distance, seconds))
+                samples.append((distance, seconds))
+    finally:
+        actuator.set_extension_minimum()
+        actuator.close()
+        pi.stop()
+    model = fit_actuator_model(samples)
+    save_actuator_model(actuator_model_path, model)
+    print('[*] Saved actuator dead time {:.2f} s, speed {:.1f} counts/s '
+          'to {}'.format(model.dead_time, model.speed, actuator_model_path))
+    return model
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Calibrate the grabber linear actuator travel time')
+    parser.add_argument(
+        '--distances', type=int, nargs='+', default=[60, 120, 180, 240])
+    parser.add_argument('--trials', type=int, default=2)
+    parser.add_argument('--settle-time', type=float, default=4.0)
+    args = parser.parse_args()
+    calibrate_actuator(args.distances, args.trials, args.settle_time)
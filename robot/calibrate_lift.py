@@ -0,0 +1,56 @@
+import argparse
+import pigpio
+
+from robot.hardware.motion_profile import (
+    MotionProfile,
+    calibrate_cruise_rate,
+    load_motion_profile,
+    save_motion_profile
+)
+from robot.hardware.stepper_motor import StepperMotor
+from robot.subsystems.lift import Lift
+from robot.utils.init import (
+    lift_profile,
+    lift_profile_path,
+    phase_a_pins,
+    phase_b_pins
+)
+
+
+def calibrate_lift(steps: int, max_rate: float, trials: int) -> MotionProfile:
+    """Find the fastest reliable lift cruise rate and save it for run_course"""
+    pi = pigpio.pi()
+    profile = load_motion_profile(lift_profile_path, lift_profile)
+    stepper = StepperMotor(phase_a_pins, phase_b_pins, pi, profile)
+
+    def move(candidate: MotionProfile, steps: int) -> None:
+        stepper.step_forward(steps, candidate)
+        stepper.step_backward(steps, candidate)
+
+    def check() -> bool:
+        answer = input('[?] Is the lift back at its starting mark? [y/n] ')
+        if answer.strip().lower().startswith('y'):
+            return True
+        input('[?] Return the lift to its starting mark and press enter ')
+        return False
+
+    try:
+        profile = calibrate_cruise_rate(
+            move, check, profile, steps, max_rate, trials=trials)
+    finally:
+        stepper.stop()
+        pi.stop()
+    save_motion_profile(lift_profile_path, profile)
+    print('[*] Saved lift cruise rate {:.0f} steps/s to {}'.format(
+        profile.cruise_rate, lift_profile_path))
+    return profile
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Calibrate the lift stepper cruise rate')
+    parser.add_argument('--steps', type=int, default=Lift.rise_steps)
+    parser.add_argument('--max-rate', type=float, default=2000)
+    parser.add_argument('--trials', type=int, default=3)
+    args = parser.parse_args()
+    calibrate_lift(args.steps, args.max_rate, args.trials)
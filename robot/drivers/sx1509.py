@@ -22,92 +22,113 @@ _SX1509_RegPullDownB = const(0x08)
 _SX1509_RegOpenDrainB = const(0x0A)
 _SX1509_RegDirB = const(0x0E)
 _SX1509_RegDataB = const(0x10)
+_SX1509_RegInterruptMaskB = const(0x12)
+_SX1509_RegSenseHighB = const(0x14)
+_SX1509_RegSenseHighA = const(0x16)
+_SX1509_RegInterruptSourceB = const(0x18)
 
 _SX1509_RegReset = const(0x7D)
 
+_SX1509_ShadowRegisters = (
+    _SX1509_RegPullUpB,
+    _SX1509_RegPullDownB,
+    _SX1509_RegOpenDrainB,
+    _SX1509_RegDirB,
+    _SX1509_RegDataB,
+    _SX1509_RegInterruptMaskB,
+    _SX1509_RegSenseHighB,
+    _SX1509_RegSenseHighA,
+)
+
 
 class SX1509:
 
     def __init__(self, i2c, address=0x3E):
         self.i2c_device = i2c_device.I2CDevice(i2c, address)
+        self._shadow = {}
         self.reset()
 
     def reset(self):
         self._write_reg_8(_SX1509_RegReset, 0x12)
         self._write_reg_8(_SX1509_RegReset, 0x34)
+        # mirror configuration registers so updates skip the read back
+        self._shadow = {
+            reg: self._read_reg_16(reg) for reg in _SX1509_ShadowRegisters
+        }
 
     def pinMode(self, pin, input_mode):
+        self.configurePins([pin], input_mode)
+
+    def configurePins(self, pins, input_mode):
         mode_bit = 1
         if (input_mode == PIN_TYPE_OUTPUT) or (
                 input_mode == PIN_TYPE_ANALOG_OUTPUT):
             mode_bit = 0
 
-        tempRegDir = self._read_reg_16(_SX1509_RegDirB)
-        if mode_bit == 1:
-            tempRegDir |= (1 << pin)
-        else:
-            tempRegDir &= ~(1 << pin)
+        tempRegDir = self._shadow[_SX1509_RegDirB]
+        for pin in pins:
+            if mode_bit == 1:
+                tempRegDir |= (1 << pin)
+            else:
+                tempRegDir &= ~(1 << pin)
 
-        self._write_reg_16(_SX1509_RegDirB, tempRegDir)
+        self._write_shadow(_SX1509_RegDirB, tempRegDir)
 
-        self.setInputMode(pin, input_mode)
+        self._set_input_modes(pins, input_mode)
 
     def setInputMode(self, pin, input_mode):
-        tempRegData = self._read_reg_16(_SX1509_RegPullUpB)
-        tempRegData &= ~(1 << pin)
-        self._write_reg_16(_SX1509_RegPullUpB, tempRegData)
-
-        tempRegData = self._read_reg_16(_SX1509_RegPullDownB)
-        tempRegData &= ~(1 << pin)
-        self._write_reg_16(_SX1509_RegPullDownB, tempRegData)
-
-        tempRegData = self._read_reg_16(_SX1509_RegOpenDrainB)
-        tempRegData &= ~(1 << pin)
-        self._write_reg_16(_SX1509_RegOpenDrainB, tempRegData)
-
-        if input_mode == PIN_TYPE_INPUT_PULLUP:
-            tempRegData = self._read_reg_16(_SX1509_RegPullUpB)
-            tempRegData |= (1 << pin)
-            self._write_reg_16(_SX1509_RegPullUpB, tempRegData)
-        elif input_mode == PIN_TYPE_INPUT_PULLDOWN:
-            tempRegData = self._read_reg_16(_SX1509_RegPullDownB)
-            tempRegData |= (1 << pin)
-            self._write_reg_16(_SX1509_RegPullDownB, tempRegData)
-        elif (input_mode == PIN_TYPE_INPUT_OPEN_DRAIN) or (input_mode == PIN_TYPE_ANALOG_OUTPUT):
-            tempRegData = self._read_reg_16(_SX1509_RegOpenDrainB)
-            tempRegData |= (1 << pin)
-            self._write_reg_16(_SX1509_RegOpenDrainB, tempRegData)
+        self._set_input_modes([pin], input_mode)
+
+    def _set_input_modes(self, pins, input_mode):
+        tempPullUp = self._shadow[_SX1509_RegPullUpB]
+        tempPullDown = self._shadow[_SX1509_RegPullDownB]
+        tempOpenDrain = self._shadow[_SX1509_RegOpenDrainB]
+
+        for pin in pins:
+            tempPullUp &= ~(1 << pin)
+            tempPullDown &= ~(1 << pin)
+            tempOpenDrain &= ~(1 << pin)
+            if input_mode == PIN_TYPE_INPUT_PULLUP:
+                tempPullUp |= (1 << pin)
+            elif input_mode == PIN_TYPE_INPUT_PULLDOWN:
+                tempPullDown |= (1 << pin)
+            elif (input_mode == PIN_TYPE_INPUT_OPEN_DRAIN) or (input_mode == PIN_TYPE_ANALOG_OUTPUT):
+                tempOpenDrain |= (1 << pin)
+
+        self._write_shadow(_SX1509_RegPullUpB, tempPullUp)
+        self._write_shadow(_SX1509_RegPullDownB, tempPullDown)
+        self._write_shadow(_SX1509_RegOpenDrainB, tempOpenDrain)
 
     def digitalWrite(self, pin, highLow):
-        tempRegDir = self._read_reg_16(_SX1509_RegDirB)
+        tempRegDir = self._shadow[_SX1509_RegDirB]
 
         # pin is output, write high/low
         if (0xFFFF ^ tempRegDir) & (1 << pin):
-            tempRegData = self._read_reg_16(_SX1509_RegDataB)
+            tempRegData = self._shadow[_SX1509_RegDataB]
             if (highLow == 1):
                 tempRegData |= (1 << pin)
             else:
                 tempRegData &= ~(1 << pin)
-            self._write_reg_16(_SX1509_RegDataB, tempRegData)
+            self._write_shadow(_SX1509_RegDataB, tempRegData)
 
         # pin is input, pull-up/pull-down
         else:
-            tempPullUp = self._read_reg_16(_SX1509_RegPullUpB)
-            tempPullDown = self._read_reg_16(_SX1509_RegPullDownB)
+            tempPullUp = self._shadow[_SX1509_RegPullUpB]
+            tempPullDown = self._shadow[_SX1509_RegPullDownB]
 
             if (highLow == 1):  # if HIGH, do pull-up, disable pull-down
                 tempPullUp |= (1 << pin)
                 tempPullDown &= ~(1 << pin)
-                self._write_reg_16(_SX1509_RegPullDownB, tempPullDown)
-                self._write_reg_16(_SX1509_RegPullUpB, tempPullUp)
+                self._write_shadow(_SX1509_RegPullDownB, tempPullDown)
+                self._write_shadow(_SX1509_RegPullUpB, tempPullUp)
             else:  # If LOW do pull-down, disable pull-up
                 tempPullDown |= (1 << pin)
                 tempPullUp &= ~(1 << pin)
-                self._write_reg_16(_SX1509_RegPullUpB, tempPullUp)
-                self._write_reg_16(_SX1509_RegPullDownB, tempPullDown)
+                self._write_shadow(_SX1509_RegPullUpB, tempPullUp)
+                self._write_shadow(_SX1509_RegPullDownB, tempPullDown)
 
     def digitalRead(self, pin):
-        tempRegDir = self._read_reg_16(_SX1509_RegDirB)
+        tempRegDir = self._shadow[_SX1509_RegDirB]
 
         if (tempRegDir & (1 << pin)):  # if the pin is an input
             tempRegData = self._read_reg_16(_SX1509_RegDataB)
@@ -116,21 +137,67 @@ class SX1509:
         # return 0 if pin is low or pin is output
         return 0
 
+    def enableInterrupts(self, pins, riseFall):
+        tempMask = self._shadow[_SX1509_RegInterruptMaskB]
+        tempSense = {
+            _SX1509_RegSenseHighB: self._shadow[_SX1509_RegSenseHighB],
+            _SX1509_RegSenseHighA: self._shadow[_SX1509_RegSenseHighA],
+        }
+
+        for pin in pins:
+            # a cleared mask bit enables the interrupt
+            tempMask &= ~(1 << pin)
+            # two sense bits per pin, bank B in 0x14-0x15, bank A in 0x16-0x17
+            reg = _SX1509_RegSenseHighB if pin >= 8 else _SX1509_RegSenseHighA
+            shift = 2 * (pin % 8)
+            tempSense[reg] &= ~(0b11 << shift)
+            tempSense[reg] |= (riseFall & 0b11) << shift
+
+        self._write_shadow(_SX1509_RegSenseHighB, tempSense[_SX1509_RegSenseHighB])
+        self._write_shadow(_SX1509_RegSenseHighA, tempSense[_SX1509_RegSenseHighA])
+        self.clearInterrupts()
+        self._write_shadow(_SX1509_RegInterruptMaskB, tempMask)
+
+    def disableInterrupts(self, pins):
+        tempMask = self._shadow[_SX1509_RegInterruptMaskB]
+        for pin in pins:
+            tempMask |= (1 << pin)
+        self._write_shadow(_SX1509_RegInterruptMaskB, tempMask)
+
+    def interruptSource(self):
+        return self._read_reg_16(_SX1509_RegInterruptSourceB)
+
+    def clearInterrupts(self):
+        self._write_reg_16(_SX1509_RegInterruptSourceB, 0xFFFF)
+
+    def readPort(self):
+        # bank B in the high byte, bank A in the low byte; reading the data
+        # register also releases NINT while RegMisc autoclear is left on
+        return self._read_reg_16(_SX1509_RegDataB)
+
+    def _write_shadow(self, reg, val):
+        # only touch the bus when the register value actually changes
+        val &= 0xFFFF
+        if self._shadow[reg] != val:
+            self._write_reg_16(reg, val)
+            self._shadow[reg] = val
+
     def _write_reg_8(self, reg, val):
-        self.i2c_device.write(bytes([reg, val]))
+        with self.i2c_device as i2c:
+            i2c.write(bytes([reg, val]))
 
     def _write_reg_16(self, reg, val):
-        self.i2c_device.write(
-            bytes([reg, ((val >> 8) & (0xFF)), (val & 0xFF)]))
+        with self.i2c_device as i2c:
+            i2c.write(bytes([reg, ((val >> 8) & (0xFF)), (val & 0xFF)]))
 
     def _read_reg_8(self, reg):
-        self.i2c_device.write(bytes([reg]))
         result = bytearray(1)
-        self.i2c_device.readinto(result)
+        with self.i2c_device as i2c:
+            i2c.write_then_readinto(bytes([reg]), result)
         return result[0]
 
     def _read_reg_16(self, reg):
-        self.i2c_device.write(bytes([reg]))
         result = bytearray(2)
-        self.i2c_device.readinto(result)
+        with self.i2c_device as i2c:
+            i2c.write_then_readinto(bytes([reg]), result)
         return ((result[0] << 8) | result[1])
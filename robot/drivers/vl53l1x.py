@@ -2,11 +2,13 @@
 # https://github.com/adafruit/Adafruit_CircuitPython_VL53L1X,
 # licensed under MIT
 
-import time
 import struct
+from typing import NamedTuple
 from adafruit_bus_device import i2c_device
 from micropython import const
 
+from robot.utils import clock
+
 _VL53L1X_VHV_CONFIG__TIMEOUT_MACROP_LOOP_BOUND = const(0x0008)
 _GPIO_HV_MUX__CTRL = const(0x0030)
 _GPIO__TIO_HV_STATUS = const(0x0031)
@@ -18,14 +20,28 @@ _RANGE_CONFIG__VCSEL_PERIOD_B = const(0x0063)
 _RANGE_CONFIG__VALID_PHASE_HIGH = const(0x0069)
 _SD_CONFIG__WOI_SD0 = const(0x0078)
 _SD_CONFIG__INITIAL_PHASE_SD0 = const(0x007A)
+_SYSTEM__INTERMEASUREMENT_PERIOD = const(0x006C)
+_RESULT__OSC_CALIBRATE_VAL = const(0x00DE)
 _SYSTEM__INTERRUPT_CLEAR = const(0x0086)
 _SYSTEM__MODE_START = const(0x0087)
+_VL53L1X_RESULT__RANGE_STATUS = const(0x0089)
 _VL53L1X_RESULT__FINAL_CROSSTALK_CORRECTED_RANGE_MM_SD0 = const(0x0096)
 _VL53L1X_IDENTIFICATION__MODEL_ID = const(0x010F)
 _ADDRESS_REGISTER = const(0x0001)
 
 _DEFAULT_ADDRESS = const(41)
 
+# result block layout starting at RESULT__RANGE_STATUS
+_RESULT_BLOCK_LENGTH = const(17)
+_RESULT_SIGNAL_RATE_OFFSET = const(15)
+_RESULT_RANGE_OFFSET = const(13)
+
+# raw device range status to ST's reported status, 0 is a valid range
+_RANGE_STATUS = (
+    255, 255, 255, 5, 2, 4, 1, 7, 3, 0, 255, 255,
+    9, 13, 255, 255, 255, 255, 10, 6, 255, 255, 11, 12,
+)
+
 TB_SHORT_DIST = {
     15: (b"\x00\x1D", b"\x00\x27"),
     20: (b"\x00\x51", b"\x00\x6E"),
@@ -45,22 +61,80 @@ TB_LONG_DIST = {
     500: (b"\x04\x8F", b"\x04\xA4"),
 }
 
+_TIMING_BUDGETS = {
+    1: TB_SHORT_DIST,
+    2: TB_LONG_DIST,
+}
+
+# phasecal timeout, VCSEL period A, VCSEL period B, valid phase high and
+# SD config (WOI SD0/SD1, initial phase SD0/SD1) for each distance mode
+_DISTANCE_MODES = {
+    1: (b"\x14", b"\x07", b"\x05", b"\x38", b"\x07\x05\x06\x06"),
+    2: (b"\x0A", b"\x0F", b"\x0D", b"\xB8", b"\x0F\x0D\x0E\x0E"),
+}
+
+
+class Measurement(NamedTuple):
+    """Single ranging result read from the result block"""
+    range_status: int
+    distance: float
+    signal_rate: int
+
 
 class VL53L1X:
     """Driver for the VL53L1X distance sensor"""
 
-    def __init__(self, i2c, address=_DEFAULT_ADDRESS):
-        self.i2c_device = i2c_device.I2CDevice(i2c, _DEFAULT_ADDRESS)
+    # seconds allowed for the first ranging after loading the configuration
+    init_timeout = 1.0
+
+    def __init__(
+            self,
+            i2c,
+            address=_DEFAULT_ADDRESS,
+            current_address=_DEFAULT_ADDRESS,
+            initialize=True):
+        self.i2c_device = i2c_device.I2CDevice(i2c, current_address)
         model_id, module_type, mask_rev = self.model_info
         if model_id != 0xEA or module_type != 0xCC or mask_rev != 0x10:
             raise RuntimeError("[!] Wrong sensor ID or type")
-        self._sensor_init()
         self._timing_budget = None
-        self.timing_budget = 50
-        if (address != _DEFAULT_ADDRESS):
+        self._distance_mode = None
+        self._inter_measurement = None
+        self._osc_calibrate = None
+        # read on first use unless begin_init loads the configuration first
+        self._polarity = None
+        if (address != current_address):
             self._change_address(i2c, address)
+        # with initialize=False the caller runs begin_init and finish_init,
+        # which lets several sensors wait out their first ranging together
+        if initialize:
+            self._sensor_init()
+            self.timing_budget = 50
+
+    @staticmethod
+    def probe(i2c, address):
+        """Returns true if a VL53L1X answers at the given address"""
+        try:
+            device = i2c_device.I2CDevice(i2c, address)
+            info = bytearray(3)
+            with device as bus:
+                bus.write_then_readinto(
+                    struct.pack(">H", _VL53L1X_IDENTIFICATION__MODEL_ID), info)
+        except (OSError, ValueError):
+            return False
+        return info[0] == 0xEA and info[1] == 0xCC and info[2] == 0x10
 
     def _sensor_init(self):
+        self.begin_init()
+        deadline = clock.monotonic() + self.init_timeout
+        while not self.data_ready:
+            if clock.monotonic() > deadline:
+                raise RuntimeError("[!] ToF sensor init timed out")
+            clock.sleep(0.01)
+        self.finish_init()
+
+    def begin_init(self):
+        """Load the default configuration and start the first ranging"""
         init_seq = bytes(
             [
                 0x00, 0x00, 0x00, 0x01, 0x02, 0x00, 0x02, 0x08, 0x00, 0x08,
@@ -76,9 +150,14 @@ class VL53L1X:
             ]
         )
         self._write_register(0x002D, init_seq)
+        self._distance_mode = None
+        self._inter_measurement = None
+        # polarity is fixed from here on, so data_ready never rereads it
+        self._polarity = self._interrupt_polarity
         self.start_ranging()
-        while not self.data_ready:
-            time.sleep(0.01)
+
+    def finish_init(self):
+        """Stop the first ranging once data_ready and finish configuration"""
         self.clear_interrupt()
         self.stop_ranging()
         self._write_register(
@@ -100,6 +179,20 @@ class VL53L1X:
         dist = struct.unpack(">H", dist)[0]
         return dist / 10
 
+    def read_measurement(self):
+        """Read status, signal rate and distance in one transaction and
+        clear the data ready interrupt"""
+        block = self._read_register(
+            _VL53L1X_RESULT__RANGE_STATUS, _RESULT_BLOCK_LENGTH)
+        self.clear_interrupt()
+        status = block[0] & 0x1F
+        if status < len(_RANGE_STATUS):
+            status = _RANGE_STATUS[status]
+        distance = struct.unpack_from(">H", block, _RESULT_RANGE_OFFSET)[0]
+        signal_rate = struct.unpack_from(
+            ">H", block, _RESULT_SIGNAL_RATE_OFFSET)[0] * 8
+        return Measurement(status, distance / 10, signal_rate)
+
     def start_ranging(self):
         """Starts ranging operation"""
         self._write_register(_SYSTEM__MODE_START, b"\x40")
@@ -118,7 +211,7 @@ class VL53L1X:
         value = self._read_register(_GPIO__TIO_HV_STATUS)
         if (
             value and value[0] & 0x01
-            == self._interrupt_polarity
+            == self.interrupt_polarity
         ):
             return True
         return False
@@ -133,26 +226,89 @@ class VL53L1X:
 
     @timing_budget.setter
     def timing_budget(self, val):
-        reg_vals = None
         mode = self.distance_mode
-        if mode == 1:
-            reg_vals = TB_SHORT_DIST
-        if mode == 2:
-            reg_vals = TB_LONG_DIST
-        if reg_vals is None:
+        if mode not in _DISTANCE_MODES:
             raise RuntimeError("[!] Unknown distance mode")
+        reg_vals = _TIMING_BUDGETS[mode]
         if val not in reg_vals.keys():
             raise ValueError("[!] Invalid timing budget")
+        vcsel_a, vcsel_b = _DISTANCE_MODES[mode][1:3]
+        # timeout A, VCSEL period A, timeout B, VCSEL period B are contiguous
         self._write_register(
-            _RANGE_CONFIG__TIMEOUT_MACROP_A_HI, reg_vals[val][0])
-        self._write_register(
-            _RANGE_CONFIG__TIMEOUT_MACROP_B_HI, reg_vals[val][1])
+            _RANGE_CONFIG__TIMEOUT_MACROP_A_HI,
+            reg_vals[val][0] + vcsel_a + reg_vals[val][1] + vcsel_b)
         self._timing_budget = val
 
+    def configure(self, distance_mode, timing_budget, inter_measurement=None):
+        """Set distance mode and timing budget together in four writes, and
+        the inter-measurement period in ms if given. Everything is checked
+        before anything is written."""
+        if distance_mode not in _DISTANCE_MODES:
+            raise ValueError("[!] Unsupported mode.")
+        reg_vals = _TIMING_BUDGETS[distance_mode]
+        if timing_budget not in reg_vals.keys():
+            raise ValueError("[!] Invalid timing budget")
+        if inter_measurement is not None and inter_measurement < timing_budget:
+            raise ValueError("[!] Inter-measurement period below timing budget")
+        phasecal, vcsel_a, vcsel_b, valid_phase, sd_config = (
+            _DISTANCE_MODES[distance_mode])
+        timeout_a, timeout_b = reg_vals[timing_budget]
+        if distance_mode != self._distance_mode:
+            self._write_register(_PHASECAL_CONFIG__TIMEOUT_MACROP, phasecal)
+        self._write_register(
+            _RANGE_CONFIG__TIMEOUT_MACROP_A_HI,
+            timeout_a + vcsel_a + timeout_b + vcsel_b)
+        if distance_mode != self._distance_mode:
+            self._write_register(_RANGE_CONFIG__VALID_PHASE_HIGH, valid_phase)
+            # WOI SD0/SD1 followed by initial phase SD0/SD1
+            self._write_register(_SD_CONFIG__WOI_SD0, sd_config)
+        self._distance_mode = distance_mode
+        self._timing_budget = timing_budget
+        if inter_measurement is not None:
+            self.inter_measurement = inter_measurement
+
+    def reconfigure(self, distance_mode, timing_budget, inter_measurement=None):
+        """Switch configuration while ranging, doing nothing if unchanged"""
+        if (
+            distance_mode == self._distance_mode
+            and timing_budget == self._timing_budget
+            and (inter_measurement is None
+                 or inter_measurement == self._inter_measurement)
+        ):
+            return
+        self.stop_ranging()
+        self.configure(distance_mode, timing_budget, inter_measurement)
+        self.clear_interrupt()
+        self.start_ranging()
+
+    @property
+    def inter_measurement(self):
+        """Period between the start of measurements in milliseconds,
+        None until set"""
+        return self._inter_measurement
+
+    @inter_measurement.setter
+    def inter_measurement(self, val):
+        if self._osc_calibrate is None:
+            self._osc_calibrate = struct.unpack(
+                ">H", self._read_register(_RESULT__OSC_CALIBRATE_VAL, 2)
+            )[0] & 0x3FF
+        period = int(self._osc_calibrate * val * 1.075)
+        self._write_register(
+            _SYSTEM__INTERMEASUREMENT_PERIOD, struct.pack(">I", period))
+        self._inter_measurement = val
+
     def _change_address(self, i2c, addr):
         self._write_register(_ADDRESS_REGISTER, addr.to_bytes(1, 'big'))
         self.i2c_device = i2c_device.I2CDevice(i2c, addr)
-        time.sleep(0.01)
+        clock.sleep(0.01)
+
+    @property
+    def interrupt_polarity(self):
+        """Level of GPIO1 while new data is ready: 1=active high, 0=active low"""
+        if self._polarity is None:
+            self._polarity = self._interrupt_polarity
+        return self._polarity
 
     @property
     def _interrupt_polarity(self):
@@ -163,34 +319,18 @@ class VL53L1X:
     @property
     def distance_mode(self):
         """The distance mode: 1=short, 2=long"""
+        if self._distance_mode is not None:
+            return self._distance_mode
         mode = self._read_register(_PHASECAL_CONFIG__TIMEOUT_MACROP)[0]
         if mode == 0x14:
-            return 1  # short distance
-        if mode == 0x0A:
-            return 2  # long distance
-        return None  # unknown
+            self._distance_mode = 1  # short distance
+        elif mode == 0x0A:
+            self._distance_mode = 2  # long distance
+        return self._distance_mode  # None if unknown
 
     @distance_mode.setter
     def distance_mode(self, mode):
-        # short distance
-        if mode == 1:
-            self._write_register(_PHASECAL_CONFIG__TIMEOUT_MACROP, b"\x14")
-            self._write_register(_RANGE_CONFIG__VCSEL_PERIOD_A, b"\x07")
-            self._write_register(_RANGE_CONFIG__VCSEL_PERIOD_B, b"\x05")
-            self._write_register(_RANGE_CONFIG__VALID_PHASE_HIGH, b"\x38")
-            self._write_register(_SD_CONFIG__WOI_SD0, b"\x07\x05")
-            self._write_register(_SD_CONFIG__INITIAL_PHASE_SD0, b"\x06\x06")
-        # long distance
-        elif mode == 2:
-            self._write_register(_PHASECAL_CONFIG__TIMEOUT_MACROP, b"\x0A")
-            self._write_register(_RANGE_CONFIG__VCSEL_PERIOD_A, b"\x0F")
-            self._write_register(_RANGE_CONFIG__VCSEL_PERIOD_B, b"\x0D")
-            self._write_register(_RANGE_CONFIG__VALID_PHASE_HIGH, b"\xB8")
-            self._write_register(_SD_CONFIG__WOI_SD0, b"\x0F\x0D")
-            self._write_register(_SD_CONFIG__INITIAL_PHASE_SD0, b"\x0E\x0E")
-        else:
-            raise ValueError("[!] Unsupported mode.")
-        self.timing_budget = self._timing_budget
+        self.configure(mode, self._timing_budget)
 
     def _write_register(self, address, data, length=None):
         if length is None:
@@ -200,7 +340,7 @@ class VL53L1X:
 
     def _read_register(self, address, length=1):
         data = bytearray(length)
+        # repeated start, so the address and the read are one transaction
         with self.i2c_device as i2c:
-            i2c.write(struct.pack(">H", address))
-            i2c.readinto(data)
+            i2c.write_then_readinto(struct.pack(">H", address), data)
         return data
@@ -1,6 +1,24 @@
 import pigpio
 import RPi.GPIO as GPIO
-from typing import Type
+from typing import Protocol, Type
+
+from robot.hardware.pwm_ramp import PWMRamp, PWMRamper
+
+
+class Motor(Protocol):
+    """What the subsystems use of a brushed motor, so models can stand in"""
+
+    def set_direction_forward(self) -> None:
+        ...
+
+    def set_direction_backward(self) -> None:
+        ...
+
+    def set_motor_pwm(self, pwm: int) -> None:
+        ...
+
+    def close(self) -> None:
+        ...
 
 
 class BrushedMotor:
@@ -16,6 +34,7 @@ class BrushedMotor:
         self.pi = pi
         self.direction_pin = direction_pin
         self.pwm_pin = pwm_pin
+        self.ramper = PWMRamper(pi, pwm_pin)
         GPIO.setup(self.direction_pin, GPIO.OUT)
         GPIO.output(self.direction_pin, GPIO.LOW)
         self.pi.set_PWM_frequency(self.pwm_pin, frequency)
@@ -35,11 +54,26 @@ class BrushedMotor:
 
     def set_motor_pwm(self, pwm: int) -> None:
         """Change duty cycle of motor"""
+        self.ramper.cancel()
         self.pi.set_PWM_dutycycle(self.pwm_pin, pwm)
 
+    def ramp_motor_pwm(
+            self,
+            start: int,
+            stop: int,
+            step_delay: float) -> PWMRamp:
+        """Step duty cycle from start toward stop, stop excluded, in the
+        pigpio daemon, holding each value for step_delay seconds"""
+        return self.ramper.start(start, stop, step_delay)
+
     def set_pwm_frequency(self, frequency: int) -> None:
         """Change PWM frequency of motor"""
         self.pi.set_PWM_frequency(self.pwm_pin, frequency)
 
     def stop_motor(self) -> None:
+        self.ramper.cancel()
         self.pi.set_PWM_dutycycle(self.pwm_pin, 0)
+
+    def close(self) -> None:
+        """Remove the ramp script from the pigpio daemon"""
+        self.ramper.close()
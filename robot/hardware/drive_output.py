@@ -0,0 +1,73 @@
+import pigpio
+from typing import List, Optional, Type
+
+from robot.hardware.brushed_motor import BrushedMotor
+
+
+class DriveOutput:
+    """Sends drive motor commands for both wheels together, skipping any
+    duty cycle or direction that is already applied"""
+
+    def __init__(
+            self,
+            pi: Type[pigpio.pi],
+            left_motor: BrushedMotor,
+            right_motor: BrushedMotor) -> None:
+        """Initialize with nothing known to be applied yet"""
+        self.pi = pi
+        self.motors = (left_motor, right_motor)
+        self.pwms: List[Optional[int]] = [None, None]
+        self.directions: List[Optional[int]] = [None, None]
+        self.issued = 0
+        self.suppressed = 0
+
+    def set(
+            self,
+            left_pwm: int,
+            right_pwm: int,
+            left_direction: Optional[int] = None,
+            right_direction: Optional[int] = None) -> None:
+        """Apply duty cycles, then directions, leaving a None direction as is"""
+        for index, pwm in enumerate((left_pwm, right_pwm)):
+            if self.pwms[index] == pwm:
+                self.suppressed += 1
+                continue
+            self.motors[index].set_motor_pwm(pwm)
+            self.pwms[index] = pwm
+            self.issued += 1
+        high = 0
+        low = 0
+        for index, direction in enumerate((left_direction, right_direction)):
+            if direction is None:
+                continue
+            if self.directions[index] == direction:
+                self.suppressed += 1
+                continue
+            bit = 1 << self.motors[index].direction_pin
+            if direction:
+                high |= bit
+            else:
+                low |= bit
+            self.directions[index] = direction
+            self.issued += 1
+        # wheels switching to the same level change together in one bank
+        # write, opposite levels take a set and a clear back to back since
+        # pigpio has no masked bank write outside of waves, which the lift
+        # stepper holds
+        if high:
+            self.pi.set_bank_1(high)
+        if low:
+            self.pi.clear_bank_1(low)
+
+    def stop(self) -> None:
+        """Stop both wheels whatever the cache says"""
+        self.pwms = [None, None]
+        self.set(0, 0)
+
+    def summary(self) -> str:
+        """Issued and suppressed command counts"""
+        total = self.issued + self.suppressed
+        return 'Drive commands: {} issued, {} suppressed ({:.1f}%)'.format(
+            self.issued,
+            self.suppressed,
+            100 * self.suppressed / total if total else 0)
@@ -1,30 +1,109 @@
 from board import I2C
-from typing import List, Tuple, Type
-from robot.drivers.sx1509 import SX1509, PIN_TYPE_INPUT
+import pigpio
+from typing import List, NamedTuple, Optional, Tuple, Type
+from robot.drivers.sx1509 import (
+    SX1509,
+    INTERRUPT_STATE_CHANGE,
+    PIN_TYPE_INPUT
+)
+from robot.utils import clock
+
+
+class LineState(NamedTuple):
+    """Line magnitudes and the time they were read"""
+    timestamp: float
+    left: int
+    right: int
 
 
 class LineFollowArray:
     """Class for cleanly interacting with line following sensor array"""
 
     multiplier_values = [1, 2, 3, 4]
+    max_interrupt_reads: int = 3
 
     def __init__(self, i2c: Type[I2C], pins: List[int]) -> None:
         """Initialize all 8 sensors on the I2C breakout"""
+        bank = pins[0] // 8
+        if any(pin // 8 != bank for pin in pins):
+            raise ValueError("[!] Line sensor pins must share one SX1509 bank")
         self.device = SX1509(i2c)
         self.pins = pins
-        for pin in pins:
-            self.device.pinMode(pin, PIN_TYPE_INPUT)
+        self.port_shift = 8 * bank
+        self.device.configurePins(pins, PIN_TYPE_INPUT)
+        # magnitudes for every possible value of the bank's data byte
+        self.magnitude_table: List[Tuple[int, int]] = [
+            self._readings_to_magnitudes(
+                self._port_to_readings(value << self.port_shift))
+            for value in range(256)
+        ]
+        self.pi: Optional[pigpio.pi] = None
+        self.interrupt_pin: Optional[int] = None
+        self.state: Optional[LineState] = None
+        self._state_valid: bool = False
+        self._callback = None
+
+    def enable_interrupts(self, pi: pigpio.pi, interrupt_pin: int) -> None:
+        """Track line changes from the SX1509 NINT output instead of polling"""
+        self.pi = pi
+        self.interrupt_pin = interrupt_pin
+        self.pi.set_mode(interrupt_pin, pigpio.INPUT)
+        self.pi.set_pull_up_down(interrupt_pin, pigpio.PUD_UP)
+        self.device.enableInterrupts(self.pins, INTERRUPT_STATE_CHANGE)
+        self._update_state()
+        # NINT is open-drain and active low
+        self._callback = self.pi.callback(
+            interrupt_pin, pigpio.FALLING_EDGE, self._on_interrupt)
+
+    def disable_interrupts(self) -> None:
+        """Return to polling the data register on every reading"""
+        if self._callback is None:
+            return
+        self._callback.cancel()
+        self._callback = None
+        self.device.disableInterrupts(self.pins)
+        self._state_valid = False
 
     def read_sensors(self) -> List[int]:
         """Read binary values from all 8 sensors"""
-        readings = []
-        for pin in self.pins[::-1]:
-            readings.append(1 - self.device.digitalRead(pin))
-        return readings
+        return self._port_to_readings(self.device.readPort())
 
     def get_sensor_reading_magnitudes(self) -> Tuple[int, int]:
         """Get equivalent magnitude values for binary list reading"""
-        readings = self.read_sensors()
+        if self._callback is not None:
+            if not self._state_valid:
+                self._update_state()
+            return (self.state.left, self.state.right)
+        port = self.device.readPort()
+        return self.magnitude_table[(port >> self.port_shift) & 0xFF]
+
+    def _update_state(self) -> None:
+        """Read the data register and cache the resulting magnitudes"""
+        port = self.device.readPort()
+        left, right = self.magnitude_table[(port >> self.port_shift) & 0xFF]
+        self.state = LineState(clock.monotonic(), left, right)
+        self._state_valid = True
+
+    def _on_interrupt(self, gpio: int, level: int, tick: int) -> None:
+        """Refresh cached line state when the SX1509 signals a change"""
+        try:
+            self._update_state()
+            # a change landing during the read leaves NINT asserted
+            for _ in range(self.max_interrupt_reads):
+                if self.pi is None or self.pi.read(self.interrupt_pin) != 0:
+                    break
+                self._update_state()
+        except BaseException:
+            print('[!] Line follower interrupt read failed')
+            # force the next reading to go to the bus
+            self._state_valid = False
+
+    def _port_to_readings(self, port: int) -> List[int]:
+        """Convert SX1509 data register to binary sensor readings"""
+        return [1 - ((port >> pin) & 1) for pin in self.pins[::-1]]
+
+    def _readings_to_magnitudes(self, readings: List[int]) -> Tuple[int, int]:
+        """Get equivalent magnitude values for binary list reading"""
         leftSum = 0
         rightSum = 0
         for index, reading in enumerate(readings[3::-1]):
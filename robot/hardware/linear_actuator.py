@@ -1,38 +1,174 @@
 import pigpio
-from typing import Type
+from typing import NamedTuple, Optional, Protocol, Sequence, Tuple, Type
+
+from robot.hardware.pwm_ramp import PWMRamp, PWMRamper
+from robot.utils import clock
+from robot.utils.actions import Waitable
+from robot.utils.persist import load_json, save_json
+
+
+class ActuatorModel(NamedTuple):
+    """Travel time of the actuator, a fixed dead time before it starts
+    moving then a constant speed in PWM counts per second"""
+    dead_time: float = 0.0
+    speed: float = 80.0
+
+    def travel_time(self, distance: float) -> float:
+        """Seconds to move distance PWM counts"""
+        if distance == 0:
+            return 0.0
+        return self.dead_time + abs(distance) / self.speed
+
+
+def fit_actuator_model(samples: Sequence[Tuple[float, float]]) -> ActuatorModel:
+    """Least squares fit of (distance, seconds) samples to a model"""
+    count = len(samples)
+    if len({distance for distance, _ in samples}) < 2:
+        raise ValueError("[!] Need samples over at least two distances")
+    mean_distance = sum(distance for distance, _ in samples) / count
+    mean_time = sum(seconds for _, seconds in samples) / count
+    covariance = sum(
+        (distance - mean_distance) * (seconds - mean_time)
+        for distance, seconds in samples)
+    variance = sum((distance - mean_distance) ** 2 for distance, _ in samples)
+    seconds_per_count = covariance / variance
+    if seconds_per_count <= 0:
+        raise ValueError("[!] Samples do not take longer with distance")
+    dead_time = mean_time - seconds_per_count * mean_distance
+    return ActuatorModel(max(0.0, dead_time), 1 / seconds_per_count)
+
+
+def load_actuator_model(path: str, default: ActuatorModel) -> ActuatorModel:
+    """Load a saved model, falling back to default for anything missing"""
+    data = load_json(path, {})
+    return default._replace(**{
+        field: data[field] for field in ActuatorModel._fields if field in data})
+
+
+def save_actuator_model(path: str, model: ActuatorModel) -> None:
+    save_json(path, model._asdict())
+
+
+class Actuator(Protocol):
+    """What the grabber uses of a linear actuator, so models can stand in"""
+
+    def remaining_travel(self) -> float:
+        ...
+
+    def set_extension_pwm(self, pwm: int) -> None:
+        ...
+
+    def ramp_extension_pwm(
+            self,
+            start: int,
+            stop: int,
+            step_delay: float) -> Waitable:
+        ...
+
+    def set_extension_minimum(self) -> None:
+        ...
+
+    def close(self) -> None:
+        ...
 
 
 class LinearActuator:
     """Class for cleanly controlling extension of Actuonix linear actuator"""
 
+    max_pwm: int = 255
+
     def __init__(
             self,
             pi: Type[pigpio.pi],
             pwm_pin: int,
-            frequency: int) -> None:
+            frequency: int,
+            model: Optional[ActuatorModel] = None) -> None:
         """Initialize linear actuator with extension of 0"""
         self.pi = pi
         self.pwm_pin = pwm_pin
+        self.ramper = PWMRamper(pi, pwm_pin)
+        if model is None:
+            model = ActuatorModel()
+        self.model: ActuatorModel = model
         self.pi.set_PWM_frequency(self.pwm_pin, frequency)
         self.pi.set_PWM_dutycycle(self.pwm_pin, 0)
+        # last commanded move, the extension is estimated along it. The
+        # extension at start up is unknown so assume it was fully out.
+        self.start_position: float = self.max_pwm
+        self.target: float = 0
+        self.start_time: float = clock.monotonic()
+        self.arrive_time: float = (
+            self.start_time + self.model.travel_time(self.max_pwm))
+
+    def position(self, now: Optional[float] = None) -> float:
+        """Estimated extension in PWM counts"""
+        if now is None:
+            now = clock.monotonic()
+        if now >= self.arrive_time:
+            return self.target
+        moving = min(self.start_time + self.model.dead_time, self.arrive_time)
+        if now <= moving:
+            return self.start_position
+        fraction = (now - moving) / (self.arrive_time - moving)
+        return self.start_position + (
+            self.target - self.start_position) * fraction
+
+    def remaining_travel(self) -> float:
+        """Seconds until the actuator reaches its commanded extension"""
+        return max(0.0, self.arrive_time - clock.monotonic())
+
+    def _command(self, pwm: int, duration: float = 0.0) -> None:
+        """Record a move to pwm taking at least duration seconds"""
+        now = clock.monotonic()
+        start = self.position(now)
+        self.start_position = start
+        self.target = pwm
+        self.start_time = now
+        self.arrive_time = now + max(
+            duration, self.model.travel_time(pwm - start))
 
     def set_extension_percent(self, percent: int) -> None:
         """Sets extension by a percent (0-100)"""
         if percent < 0 or percent > 100:
             return
         adj_pwm = int((percent / 100) * 255)
+        self.ramper.cancel()
         self.pi.set_PWM_dutycycle(self.pwm_pin, adj_pwm)
+        self._command(adj_pwm)
 
     def set_extension_pwm(self, pwm: int) -> None:
         """Sets extension by a PWM (0-255)"""
         if pwm < 0 or pwm > 255:
             return
+        self.ramper.cancel()
         self.pi.set_PWM_dutycycle(self.pwm_pin, pwm)
+        self._command(pwm)
+
+    def ramp_extension_pwm(
+            self,
+            start: int,
+            stop: int,
+            step_delay: float) -> PWMRamp:
+        """Step extension PWM from start toward stop, stop excluded, in the
+        pigpio daemon, holding each value for step_delay seconds"""
+        ramp = self.ramper.start(start, stop, step_delay)
+        if stop != start:
+            last = stop - 1 if stop > start else stop + 1
+            self._command(last, abs(stop - start) * step_delay)
+        return ramp
 
     def set_extension_minimum(self) -> None:
         """Retracts linear actuator completely"""
+        self.ramper.cancel()
         self.pi.set_PWM_dutycycle(self.pwm_pin, 0)
+        self._command(0)
 
     def set_extension_maximum(self) -> None:
         """Extends linear actuator completely"""
+        self.ramper.cancel()
         self.pi.set_PWM_dutycycle(self.pwm_pin, 255)
+        self._command(255)
+
+    def close(self) -> None:
+        """Remove the ramp script from the pigpio daemon"""
+        self.ramper.close()
@@ -0,0 +1,114 @@
+import math
+from typing import Callable, List, NamedTuple
+
+from robot.utils.persist import load_json, save_json
+
+
+class ProfileSegments(NamedTuple):
+    """A move split into per step delays around a constant rate cruise"""
+    accelerate: List[float]
+    cruise_steps: int
+    cruise_delay: float
+    decelerate: List[float]
+
+
+class MotionProfile(NamedTuple):
+    """Stepper rates in steps/s and acceleration in steps/s^2. Moves start
+    at start_rate, speed up to cruise_rate and slow back down to stop."""
+    start_rate: float = 200
+    cruise_rate: float = 200
+    acceleration: float = 2000
+    # ease into and out of the ramps instead of a constant acceleration
+    s_curve: bool = False
+
+    @property
+    def ramp_steps(self) -> int:
+        """Steps taken to reach cruise_rate from start_rate"""
+        if self.cruise_rate <= self.start_rate or self.acceleration <= 0:
+            return 0
+        return math.ceil(
+            (self.cruise_rate ** 2 - self.start_rate ** 2) /
+            (2 * self.acceleration))
+
+    def rate_at(self, step: int) -> float:
+        """Rate after step steps of the ramp"""
+        ramp = self.ramp_steps
+        if step >= ramp:
+            return max(self.start_rate, self.cruise_rate)
+        if self.s_curve:
+            x = step / ramp
+            return self.start_rate + (
+                (self.cruise_rate - self.start_rate) * x * x * (3 - 2 * x))
+        return math.sqrt(
+            self.start_rate ** 2 + 2 * self.acceleration * step)
+
+    def segments(self, steps: int) -> ProfileSegments:
+        """Split a move of steps into ramps and cruise, short moves turning
+        back to decelerate before reaching cruise_rate"""
+        ramp = min(self.ramp_steps, steps // 2)
+        accelerate = [1 / self.rate_at(step) for step in range(ramp)]
+        return ProfileSegments(
+            accelerate,
+            steps - 2 * ramp,
+            1 / self.rate_at(ramp),
+            accelerate[::-1])
+
+    def step_delays(self, steps: int) -> List[float]:
+        """Delay after each step of a move"""
+        segments = self.segments(steps)
+        return (
+            segments.accelerate +
+            [segments.cruise_delay] * segments.cruise_steps +
+            segments.decelerate)
+
+    def duration(self, steps: int) -> float:
+        """Time a move of steps takes"""
+        return sum(self.step_delays(steps))
+
+
+def load_motion_profile(path: str, default: MotionProfile) -> MotionProfile:
+    """Load a saved profile, falling back to default for anything missing"""
+    data = load_json(path, {})
+    return default._replace(**{
+        field: data[field] for field in MotionProfile._fields if field in data})
+
+
+def save_motion_profile(path: str, profile: MotionProfile) -> None:
+    save_json(path, profile._asdict())
+
+
+def calibrate_cruise_rate(
+        move: Callable[[MotionProfile, int], None],
+        check: Callable[[], bool],
+        profile: MotionProfile,
+        steps: int,
+        max_rate: float,
+        resolution: float = 25,
+        trials: int = 3,
+        margin: float = 0.8) -> MotionProfile:
+    """Search for the highest cruise rate the motor keeps up with.
+
+    move(profile, steps) runs a move out and back with the given profile,
+    and check() reports whether the motor returned to where it started,
+    i.e. no steps were lost, putting it back there if not. A rate must
+    pass every trial to count. The result is scaled down by margin, never
+    going below start_rate."""
+    low, high = profile.start_rate, max_rate
+    while high - low > resolution:
+        rate = (low + high) / 2
+        candidate = profile._replace(cruise_rate=rate)
+        reliable = True
+        for _ in range(trials):
+            move(candidate, steps)
+            if not check():
+                reliable = False
+                break
+        print('[*] Cruise rate {:.0f} steps/s {}'.format(
+            rate, 'passed' if reliable else 'failed'))
+        if reliable:
+            low = rate
+        else:
+            high = rate
+    return profile._replace(
+        cruise_rate=max(profile.start_rate, low * margin))
+
@@ -0,0 +1,100 @@
+import pigpio
+from typing import Optional
+
+from robot.utils import clock
+
+# Steps the duty cycle of GPIO p0 from p1 by p4 every p2 microseconds for
+# p3 steps, counting down when p5 is 0 and up otherwise. Every value is
+# held for the full delay, matching a set_PWM_dutycycle and sleep loop.
+RAMP_SCRIPT = (
+    'ld v0 p1 ld v1 p3 '
+    'tag 0 pwm p0 v0 mics p2 '
+    'lda p5 cmp 0 jz 1 '
+    'lda v0 add p4 sta v0 jmp 2 '
+    'tag 1 lda v0 sub p4 sta v0 '
+    'tag 2 dcr v1 lda v1 cmp 0 jnz 0'
+)
+
+
+class PWMRamp:
+    """Handle for a duty cycle ramp run by the pigpio daemon"""
+
+    def __init__(self, pi: pigpio.pi, script_id: Optional[int]) -> None:
+        """Track the script running the ramp, None for an empty ramp"""
+        self.pi = pi
+        self.script_id = script_id
+        self.error: Optional[BaseException] = None
+        self._done = script_id is None
+
+    @property
+    def done(self) -> bool:
+        if not self._done:
+            status, _ = self.pi.script_status(self.script_id)
+            if status == pigpio.PI_SCRIPT_FAILED:
+                self.error = RuntimeError("[!] PWM ramp script failed")
+            if status not in (pigpio.PI_SCRIPT_INITING, pigpio.PI_SCRIPT_RUNNING):
+                self._done = True
+        return self._done
+
+    def cancel(self) -> None:
+        """Stop the ramp where it is"""
+        if not self.done:
+            self.pi.stop_script(self.script_id)
+            self._done = True
+
+
+class PWMRamper:
+    """Runs duty cycle ramps on one GPIO, one ramp at a time"""
+
+    def __init__(self, pi: pigpio.pi, pwm_pin: int) -> None:
+        """Initialize without storing the script until the first ramp"""
+        self.pi = pi
+        self.pwm_pin = pwm_pin
+        self.script_id: Optional[int] = None
+        self.ramp: Optional[PWMRamp] = None
+
+    def _store(self) -> int:
+        """Store the ramp script with the daemon and wait for it to be ready"""
+        if self.script_id is None:
+            script_id = self.pi.store_script(RAMP_SCRIPT.encode())
+            while self.pi.script_status(script_id)[0] == pigpio.PI_SCRIPT_INITING:
+                clock.sleep(0.001)
+            self.script_id = script_id
+        return self.script_id
+
+    def start(self, start: int, stop: int, step_delay: float) -> PWMRamp:
+        """Step the duty cycle from start toward stop, stop excluded,
+        holding each value for step_delay seconds. Replaces any ramp
+        still running."""
+        self.cancel()
+        if not 0 < step_delay < 1:
+            raise ValueError("[!] PWM ramp step delay must be under 1 s")
+        if stop == start:
+            return PWMRamp(self.pi, None)
+        last = stop - 1 if stop > start else stop + 1
+        if not (0 <= start <= 255 and 0 <= last <= 255):
+            raise ValueError("[!] PWM ramp must stay within 0-255")
+        script_id = self._store()
+        self.pi.run_script(script_id, [
+            self.pwm_pin,
+            start,
+            int(step_delay * 1000000),
+            abs(stop - start),
+            1,
+            1 if stop > start else 0,
+        ])
+        self.ramp = PWMRamp(self.pi, script_id)
+        return self.ramp
+
+    def cancel(self) -> None:
+        """Stop the running ramp, if any"""
+        if self.ramp is not None:
+            self.ramp.cancel()
+            self.ramp = None
+
+    def close(self) -> None:
+        """Stop any ramp and remove the script from the daemon"""
+        self.cancel()
+        if self.script_id is not None:
+            self.pi.delete_script(self.script_id)
+            self.script_id = None
@@ -1,94 +1,304 @@
-from enum import Enum
+import pigpio
 import RPi.GPIO as GPIO
-import time
-from typing import Tuple
+from typing import List, Optional, Protocol, Sequence, Tuple, Union
 
+from robot.hardware.motion_profile import MotionProfile
+from robot.utils import clock
+from robot.utils.actions import ThreadTask, Waitable
 
-class Phase(Enum):
-    ONE = 0
-    TWO = 1
-    THREE = 3
-    FOUR = 4
+
+class WaveMotion:
+    """Handle for a move played out by the pigpio daemon as a waveform"""
+
+    def __init__(
+            self,
+            stepper: 'StepperMotor',
+            pi: pigpio.pi,
+            waves: List[int]) -> None:
+        """Track a transmitting move and the waves it uses"""
+        self.stepper = stepper
+        self.pi = pi
+        self.waves = waves
+        self.error: Optional[BaseException] = None
+        self._done = False
+
+    @property
+    def done(self) -> bool:
+        if not self._done and not self.pi.wave_tx_busy():
+            self._finish()
+        return self._done
+
+    def cancel(self) -> None:
+        """Stop transmitting and release the coils"""
+        if self._done:
+            return
+        self.pi.wave_tx_stop()
+        # where the rotor stopped in the sequence is unknown
+        self.stepper.reset_phase()
+        self._finish()
+
+    def _finish(self) -> None:
+        for wave in self.waves:
+            self.pi.wave_delete(wave)
+        self._done = True
+        if self.stepper.motion is self:
+            self.stepper.motion = None
+
+
+Motion = Union[ThreadTask, WaveMotion]
+
+
+class Stepper(Protocol):
+    """What the lift uses of a stepper motor, so models can stand in"""
+
+    coils: Tuple[int, int, int, int]
+    coil: Optional[int]
+
+    def start_path(
+            self,
+            path: Sequence[int],
+            profile: Optional[MotionProfile] = None) -> Waitable:
+        ...
+
+    def start_backward(
+            self,
+            steps: int,
+            profile: Optional[MotionProfile] = None) -> Waitable:
+        ...
+
+    def reset_phase(self) -> None:
+        ...
+
+    def stop(self) -> None:
+        ...
 
 
 class StepperMotor:
     """Class for cleanly controlling operation of DC stepper motor"""
 
     step_delay = 0.005
+    wave_poll_interval = 0.001
 
     def __init__(
             self,
             phase_a_pins: Tuple[int, int],
-            phase_b_pins: Tuple[int, int]) -> None:
-        """Initialize pins for stepper motor"""
+            phase_b_pins: Tuple[int, int],
+            pi: Optional[pigpio.pi] = None,
+            profile: Optional[MotionProfile] = None) -> None:
+        """Initialize pins for stepper motor, driving them with pigpio
+        waveforms when given a pigpio connection. Moves follow profile,
+        by default a constant rate of one step per step_delay."""
         self.phase_a_pins = phase_a_pins
         self.phase_b_pins = phase_b_pins
-        self.phase = Phase.ONE
-        GPIO.setup(self.phase_a_pins[0], GPIO.OUT)
-        GPIO.setup(self.phase_a_pins[1], GPIO.OUT)
-        GPIO.setup(self.phase_b_pins[0], GPIO.OUT)
-        GPIO.setup(self.phase_b_pins[1], GPIO.OUT)
-        GPIO.output(self.phase_a_pins[0], GPIO.LOW)
-        GPIO.output(self.phase_a_pins[1], GPIO.LOW)
-        GPIO.output(self.phase_b_pins[0], GPIO.LOW)
-        GPIO.output(self.phase_b_pins[1], GPIO.LOW)
+        self.pi = pi
+        if profile is None:
+            rate = 1 / self.step_delay
+            profile = MotionProfile(rate, rate)
+        self.profile: MotionProfile = profile
+        # coils in the order they are energized stepping forward
+        self.coils: Tuple[int, int, int, int] = (
+            phase_b_pins[1],
+            phase_a_pins[1],
+            phase_b_pins[0],
+            phase_a_pins[0])
+        # index of the energized coil, None with all coils released
+        self.coil: Optional[int] = None
+        self.stop_requested = False
+        self.motion: Optional[WaveMotion] = None
+        for pin in self.coils:
+            if self.pi is None:
+                GPIO.setup(pin, GPIO.OUT)
+                GPIO.output(pin, GPIO.LOW)
+            else:
+                self.pi.set_mode(pin, pigpio.OUTPUT)
+                self.pi.write(pin, 0)
+
+    def release(self) -> None:
+        """Switch every coil off, remembering the phase so the next move
+        carries on from where the rotor was left"""
+        for pin in self.coils:
+            if self.pi is None:
+                GPIO.output(pin, GPIO.LOW)
+            else:
+                self.pi.write(pin, 0)
 
     def reset_phase(self):
-        """Resets the stepper motor phase to phase one"""
-        GPIO.output(self.phase_a_pins[0], GPIO.LOW)
-        GPIO.output(self.phase_a_pins[1], GPIO.LOW)
-        GPIO.output(self.phase_b_pins[0], GPIO.LOW)
-        GPIO.output(self.phase_b_pins[1], GPIO.LOW)
-        self.phase = Phase.ONE
+        """Switch every coil off so the next move starts from phase one"""
+        self.release()
+        self.coil = None
+
+    @property
+    def coil_mask(self) -> int:
+        """Bit mask of all four coil pins"""
+        mask = 0
+        for pin in self.coils:
+            mask |= 1 << pin
+        return mask
+
+    def stop(self) -> None:
+        """Abandon any move in progress and release the coils"""
+        self.stop_requested = True
+        if self.motion is not None:
+            self.motion.cancel()
+        self.reset_phase()
+
+    def _next_coil(self, direction: int) -> int:
+        """Index of the coil energized by the next step in direction"""
+        if self.coil is None:
+            return 0
+        return (self.coil + direction) % len(self.coils)
+
+    def _step_one(self, direction: int, delay: Optional[float] = None) -> None:
+        """Move the energized coil one place along the sequence"""
+        coil = self._next_coil(direction)
+        if self.coil is not None:
+            GPIO.output(self.coils[self.coil], GPIO.LOW)
+        GPIO.output(self.coils[coil], GPIO.HIGH)
+        self.coil = coil
+        clock.sleep(self.step_delay if delay is None else delay)
 
     def step_one_forward(self):
         """Turn the stepper motor one step forward based on current phase"""
-        if self.phase == Phase.ONE:
-            GPIO.output(self.phase_a_pins[0], GPIO.LOW)
-            GPIO.output(self.phase_b_pins[1], GPIO.HIGH)
-            self.phase = Phase.TWO
-        elif self.phase == Phase.TWO:
-            GPIO.output(self.phase_b_pins[1], GPIO.LOW)
-            GPIO.output(self.phase_a_pins[1], GPIO.HIGH)
-            self.phase = Phase.THREE
-        elif self.phase == Phase.THREE:
-            GPIO.output(self.phase_a_pins[1], GPIO.LOW)
-            GPIO.output(self.phase_b_pins[0], GPIO.HIGH)
-            self.phase = Phase.FOUR
-        elif self.phase == Phase.FOUR:
-            GPIO.output(self.phase_b_pins[0], GPIO.LOW)
-            GPIO.output(self.phase_a_pins[0], GPIO.HIGH)
-            self.phase = Phase.ONE
-        time.sleep(self.step_delay)
-
-    def step_forward(self, steps: int):
-        """Turn the stepper motor forward the specified number of steps"""
-        for _ in range(steps):
-            self.step_one_forward()
-        self.reset_phase()
+        self._step_one(1)
 
     def step_one_backward(self):
         """Turn the stepper motor one step backward based on current phase"""
-        if self.phase == Phase.ONE:
-            GPIO.output(self.phase_a_pins[1], GPIO.LOW)
-            GPIO.output(self.phase_b_pins[1], GPIO.HIGH)
-            self.phase = Phase.TWO
-        elif self.phase == Phase.TWO:
-            GPIO.output(self.phase_b_pins[1], GPIO.LOW)
-            GPIO.output(self.phase_a_pins[0], GPIO.HIGH)
-            self.phase = Phase.THREE
-        elif self.phase == Phase.THREE:
-            GPIO.output(self.phase_a_pins[0], GPIO.LOW)
-            GPIO.output(self.phase_b_pins[0], GPIO.HIGH)
-            self.phase = Phase.FOUR
-        elif self.phase == Phase.FOUR:
-            GPIO.output(self.phase_b_pins[0], GPIO.LOW)
-            GPIO.output(self.phase_a_pins[1], GPIO.HIGH)
-            self.phase = Phase.ONE
-        time.sleep(self.step_delay)
-
-    def step_backward(self, steps: int):
+        self._step_one(-1)
+
+    def step_path(
+            self,
+            path: Sequence[int],
+            profile: Optional[MotionProfile] = None) -> None:
+        """Run signed step counts back to back, blocking until done. The
+        coils stay energized between segments, each ramping on its own."""
+        if profile is None:
+            profile = self.profile
+        if self.pi is not None:
+            motion = self._start_wave(path, profile)
+            while not motion.done:
+                clock.sleep(self.wave_poll_interval)
+            return
+        self.stop_requested = False
+        self._run_path(path, profile)
+
+    def _run_path(self, path: Sequence[int], profile: MotionProfile) -> None:
+        """Step the coils through path until done or stop is requested"""
+        for steps in path:
+            direction = 1 if steps > 0 else -1
+            for delay in profile.step_delays(abs(steps)):
+                if self.stop_requested:
+                    self.reset_phase()
+                    return
+                self._step_one(direction, delay)
+        self.release()
+
+    def step_forward(
+            self,
+            steps: int,
+            profile: Optional[MotionProfile] = None):
+        """Turn the stepper motor forward the specified number of steps"""
+        self.step_path([steps], profile)
+
+    def step_backward(
+            self,
+            steps: int,
+            profile: Optional[MotionProfile] = None):
         """Turn the stepper motor backward the specified number of steps"""
-        for _ in range(steps):
-            self.step_one_backward()
-        self.reset_phase()
+        self.step_path([-steps], profile)
+
+    def start_path(
+            self,
+            path: Sequence[int],
+            profile: Optional[MotionProfile] = None) -> Motion:
+        """Run signed step counts back to back without blocking"""
+        if profile is None:
+            profile = self.profile
+        if self.pi is not None:
+            return self._start_wave(path, profile)
+        # cleared before the thread starts, so a stop right after this
+        # returns cannot be overwritten by the thread
+        self.stop_requested = False
+        path_profile = profile
+        return ThreadTask(lambda: self._run_path(path, path_profile))
+
+    def start_forward(
+            self,
+            steps: int,
+            profile: Optional[MotionProfile] = None) -> Motion:
+        """Turn the stepper motor forward without blocking"""
+        return self.start_path([steps], profile)
+
+    def start_backward(
+            self,
+            steps: int,
+            profile: Optional[MotionProfile] = None) -> Motion:
+        """Turn the stepper motor backward without blocking"""
+        return self.start_path([-steps], profile)
+
+    def _wave_pulses(
+            self,
+            delays: List[float],
+            direction: int) -> List[pigpio.pulse]:
+        """Pulses stepping on from the current coil, each energizing one
+        coil, switching off the rest and holding for its delay"""
+        mask = self.coil_mask
+        pulses = []
+        for delay in delays:
+            self.coil = self._next_coil(direction)
+            on = 1 << self.coils[self.coil]
+            pulses.append(
+                pigpio.pulse(on, mask & ~on, int(delay * 1000000)))
+        return pulses
+
+    @staticmethod
+    def _create_wave(pi: pigpio.pi, pulses: List[pigpio.pulse]) -> int:
+        pi.wave_add_new()
+        pi.wave_add_generic(pulses)
+        return pi.wave_create()
+
+    def _start_wave(
+            self,
+            path: Sequence[int],
+            profile: MotionProfile) -> WaveMotion:
+        """Compile each segment into its acceleration ramp, a four step
+        cruise cycle repeated by the daemon, and the rest of the cruise
+        with the deceleration ramp, then a final pulse releasing the coils"""
+        pi = self.pi
+        if pi is None:
+            raise RuntimeError("[!] Waveforms need a pigpio connection")
+        if self.motion is not None:
+            raise RuntimeError("[!] Stepper motor is already moving")
+        waves = []
+        chain = []
+        pulses = []
+        for steps in path:
+            direction = 1 if steps > 0 else -1
+            segments = profile.segments(abs(steps))
+            cycles, remainder = divmod(segments.cruise_steps, len(self.coils))
+            if cycles > 0xFFFF:
+                raise ValueError("[!] Too many steps for a single wave chain")
+            if cycles > 0:
+                # a full cycle ends on the coil it started after, so the
+                # same wave can be repeated and the rest continues from it
+                pulses += self._wave_pulses(segments.accelerate, direction)
+                if pulses:
+                    ramp = self._create_wave(pi, pulses)
+                    waves.append(ramp)
+                    chain.append(ramp)
+                    pulses = []
+                cycle = self._create_wave(pi, self._wave_pulses(
+                    [segments.cruise_delay] * len(self.coils), direction))
+                waves.append(cycle)
+                chain += [255, 0, cycle, 255, 1, cycles & 0xFF, cycles >> 8]
+            else:
+                pulses += self._wave_pulses(segments.accelerate, direction)
+            pulses += self._wave_pulses(
+                [segments.cruise_delay] * remainder + segments.decelerate,
+                direction)
+        pulses.append(pigpio.pulse(0, self.coil_mask, 0))
+        finish = self._create_wave(pi, pulses)
+        waves.append(finish)
+        chain.append(finish)
+        pi.wave_chain(chain)
+        self.motion = WaveMotion(self, pi, waves)
+        return self.motion
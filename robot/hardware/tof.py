@@ -1,30 +1,168 @@
 from board import I2C
-from statistics import mean
-from typing import List, Type
+import pigpio
+import RPi.GPIO as GPIO
+import threading
+from typing import NamedTuple, Optional, Type
 
-from robot.drivers.vl53l1x import VL53L1X
+from robot.drivers.vl53l1x import VL53L1X, Measurement
+from robot.utils import clock
+from robot.utils.filters import Filter, default_tof_filter
+
+
+class RangingProfile(NamedTuple):
+    """Distance mode, timing budget and inter-measurement period in ms"""
+    distance_mode: int
+    timing_budget: int
+    inter_measurement: Optional[int] = None
 
 
 class TOF:
     """Class for cleaning interacting with a single time-of-flight sensor"""
 
-    def __init__(self, i2c: Type[I2C], address: int = 41) -> None:
-        """Initialize VL53L1X sensor"""
-        self.device = VL53L1X(i2c, address)
-        self.device.distance_mode = 2
-        self.device.timing_budget = 100
+    distance_mode: int = 2
+    timing_budget: int = 100
+    xshut_delay: float = 0.01
+
+    def __init__(
+            self,
+            i2c: Type[I2C],
+            address: int = 41,
+            distance_filter: Optional[Filter] = None,
+            xshut_pin: Optional[int] = None,
+            device: Optional[VL53L1X] = None) -> None:
+        """Initialize VL53L1X sensor, or wrap one already brought up"""
+        self.i2c = i2c
+        self.address = address
+        self.xshut_pin = xshut_pin
+        self.profile = RangingProfile(self.distance_mode, self.timing_budget)
+        self._pending_profile: Optional[RangingProfile] = None
+        if device is None:
+            self._start_device()
+        else:
+            self.device = device
+        if distance_filter is None:
+            distance_filter = default_tof_filter()
+        self.filter: Filter = distance_filter
+        # bring-up counts as the latest sample so a new sensor is not stale
+        self.timestamp: float = clock.monotonic()
+        self.error: Optional[BaseException] = None
+        self._lock = threading.Lock()
+        # held around all I2C traffic, which comes from both the pigpio
+        # callback thread and the thread reading the sensor
+        self._device_lock = threading.Lock()
+        self._pi: Optional[pigpio.pi] = None
+        self._interrupt_pin: Optional[int] = None
+        self._callback = None
+        self._tick_origin: int = 0
+        self._time_origin: float = 0
+
+    def enable_interrupt(self, pi: pigpio.pi, gpio_pin: int) -> None:
+        """Sample on GPIO1 data ready edges instead of polling the sensor"""
+        self._pi = pi
+        self._interrupt_pin = gpio_pin
+        pi.set_mode(gpio_pin, pigpio.INPUT)
+        # pigpio ticks are microseconds, anchor them to the monotonic clock
+        self._tick_origin = pi.get_current_tick()
+        self._time_origin = clock.monotonic()
+        edge = pigpio.RISING_EDGE
+        if not self.device.interrupt_polarity:
+            edge = pigpio.FALLING_EDGE
+        self._callback = pi.callback(gpio_pin, edge, self._on_data_ready)
+        # a result may already be waiting with its edge long gone
+        with self._device_lock:
+            self.device.clear_interrupt()
+
+    @property
+    def sample_period(self) -> float:
+        """Seconds between the starts of measurements in the current profile"""
+        profile = self.profile
+        return max(profile.timing_budget, profile.inter_measurement or 0) / 1000
+
+    def _start_device(self) -> None:
+        """Bring up the VL53L1X at this sensor's address and start ranging"""
+        self.device = VL53L1X(self.i2c, self.address)
+        self.device.configure(*self.profile)
         self.device.start_ranging()
-        self.distances: List[int] = []
+
+    def request_profile(self, profile: RangingProfile) -> None:
+        """Ask for a ranging profile, applied by the thread reading the sensor"""
+        if profile == self.profile and self._pending_profile is None:
+            return
+        self._pending_profile = profile
+
+    def _apply_pending_profile(self) -> None:
+        """Switch the sensor to the most recently requested profile"""
+        profile, self._pending_profile = self._pending_profile, None
+        if profile is None:
+            return
+        with self._device_lock:
+            self.device.reconfigure(*profile)
+        self.profile = profile
+
+    def reinitialize(self) -> None:
+        """Power cycle only this sensor through XSHUT and bring it back up,
+        keeping its filter history. Every other sensor must already be
+        readdressed so this one alone answers at the default address."""
+        if self.xshut_pin is None:
+            raise RuntimeError("[!] No XSHUT pin to reset sensor with")
+        self.close()
+        GPIO.output(self.xshut_pin, GPIO.LOW)
+        clock.sleep(self.xshut_delay)
+        GPIO.output(self.xshut_pin, GPIO.HIGH)
+        clock.sleep(self.xshut_delay)
+        try:
+            self._start_device()
+        except BaseException:
+            # hold it in shutdown so it cannot answer at the default
+            # address while another sensor is being brought up
+            GPIO.output(self.xshut_pin, GPIO.LOW)
+            raise
+        self.timestamp = clock.monotonic()
+        self.error = None
+        if self._interrupt_pin is not None:
+            self.enable_interrupt(self._pi, self._interrupt_pin)
+
+    def close(self) -> None:
+        """Stop reacting to data ready edges"""
+        if self._callback is not None:
+            self._callback.cancel()
+            self._callback = None
 
     def get_distance(self) -> float:
         """Get and return distance reading of sensor"""
-        if self.device.data_ready:
-            # distance returned is running average of the past five distances
-            if len(self.distances) == 5:
-                self.distances.pop(0)
-            distance = self.device.distance
-            if distance != 0:
-                self.distances.append(self.device.distance)
-        if len(self.distances) != 0:
-            return mean(self.distances)
-        return 0
+        if self._pending_profile is not None:
+            self._apply_pending_profile()
+        if self._callback is not None:
+            if self.error is not None:
+                error, self.error = self.error, None
+                raise error
+        else:
+            with self._device_lock:
+                measurement = None
+                if self.device.data_ready:
+                    measurement = self.device.read_measurement()
+            if measurement is not None:
+                self._add_measurement(measurement, clock.monotonic())
+        with self._lock:
+            return self.filter.value
+
+    def _on_data_ready(self, gpio: int, level: int, tick: int) -> None:
+        """Read the finished measurement stamped with the edge time"""
+        elapsed = ((tick - self._tick_origin) & 0xFFFFFFFF) / 1000000
+        try:
+            with self._device_lock:
+                measurement = self.device.read_measurement()
+        except BaseException as e:
+            # surfaced to the reader on its next get_distance
+            self.error = e
+            return
+        self._add_measurement(measurement, self._time_origin + elapsed)
+
+    def _add_measurement(
+            self,
+            measurement: Measurement,
+            timestamp: float) -> None:
+        """Pass measurement through the sensor's filter"""
+        with self._lock:
+            self.filter.update(measurement.distance, measurement.range_status)
+            self.timestamp = timestamp
@@ -0,0 +1,162 @@
+import queue
+import threading
+from typing import Callable, Dict, FrozenSet, Mapping, NamedTuple, Optional, Set, Tuple
+
+from robot.hardware.tof import TOF
+from robot.utils import clock
+
+
+class TOFSnapshot(NamedTuple):
+    """Immutable set of distances taken in one pass over all five sensors"""
+    timestamp: float
+    left: float
+    middle: float
+    right: float
+    top: float
+    bottom: float
+    sample_times: Tuple[float, float, float, float, float]
+    stale: FrozenSet[str]
+
+
+class TOFArray:
+    """Class for continuously sampling all time-of-flight sensors off the control loop"""
+
+    sensor_names = ('left', 'middle', 'right', 'top', 'bottom')
+    # retry delay for a sensor polled before its measurement finished
+    poll_interval: float = 0.005
+    # longest sleep between passes, so stale sensors are still noticed
+    max_poll_wait: float = 0.05
+    # a sensor with no sample for this long is reported stale
+    max_sample_age: float = 0.5
+    # a sensor with no sample for this long is reinitialized
+    recovery_sample_age: float = 2.0
+    recovery_retry_delay: float = 0.1
+
+    def __init__(self, init_devices: Callable[[], Mapping[str, TOF]]) -> None:
+        """Initialize sensors using the given bring-up function"""
+        self.devices: Mapping[str, TOF] = init_devices()
+        # snapshot is replaced, never mutated, so readers need no lock
+        self.snapshot: Optional[TOFSnapshot] = None
+        self.recovering: Set[str] = set()
+        self._recovering_lock = threading.Lock()
+        self._last_distances: Dict[str, float] = {
+            name: 0 for name in self.sensor_names}
+        self._recovery_queue: 'queue.Queue[str]' = queue.Queue()
+        self._recovery_wake = threading.Event()
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._recovery_thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        """Start background acquisition and recovery threads"""
+        if self._thread is not None:
+            return
+        self._stop_event.clear()
+        self._thread = clock.start_thread(self._run, 'tof-acquisition')
+        self._recovery_thread = clock.start_thread(
+            self._run_recovery, 'tof-recovery')
+
+    def stop(self) -> None:
+        """Stop background threads and wait for them to exit"""
+        if self._thread is not None:
+            self._stop_event.set()
+            clock.join(self._thread)
+            if self._recovery_thread is not None:
+                clock.join(self._recovery_thread)
+            self._thread = None
+            self._recovery_thread = None
+        for device in self.devices.values():
+            device.close()
+
+    def wait_for_snapshot(self, timeout: Optional[float] = None) -> bool:
+        """Block until the first snapshot is published"""
+        start = clock.monotonic()
+        while self.snapshot is None:
+            if timeout is not None and clock.monotonic() - start > timeout:
+                return False
+            clock.sleep(self.poll_interval)
+        return True
+
+    def _run(self) -> None:
+        """Poll each sensor when its next measurement is due and publish a
+        snapshot after each pass"""
+        next_polls = {name: clock.monotonic() for name in self.sensor_names}
+        while not self._stop_event.is_set():
+            now = clock.monotonic()
+            with self._recovering_lock:
+                stale = set(self.recovering)
+            for name in self.sensor_names:
+                if name in stale:
+                    continue
+                device = self.devices[name]
+                if now >= next_polls[name]:
+                    previous = device.timestamp
+                    try:
+                        self._last_distances[name] = device.get_distance()
+                    except BaseException:
+                        print('[!] ToF error occurred on {} sensor'.format(name))
+                        self._recover(name)
+                        stale.add(name)
+                        continue
+                    if device.timestamp != previous:
+                        # nothing new until the next measurement finishes
+                        next_polls[name] = device.timestamp + device.sample_period
+                    else:
+                        next_polls[name] = now + self.poll_interval
+                age = now - device.timestamp
+                if age > self.recovery_sample_age:
+                    print('[!] ToF {} sensor stopped sampling'.format(name))
+                    self._recover(name)
+                if age > self.max_sample_age:
+                    stale.add(name)
+            distances, devices = self._last_distances, self.devices
+            self.snapshot = TOFSnapshot(
+                clock.monotonic(),
+                distances['left'],
+                distances['middle'],
+                distances['right'],
+                distances['top'],
+                distances['bottom'],
+                (
+                    devices['left'].timestamp,
+                    devices['middle'].timestamp,
+                    devices['right'].timestamp,
+                    devices['top'].timestamp,
+                    devices['bottom'].timestamp),
+                frozenset(stale))
+            next_poll = min(
+                [next_polls[name] for name in self.sensor_names
+                 if name not in stale] + [now + self.max_poll_wait])
+            clock.wait(
+                self._stop_event, max(next_poll - clock.monotonic(), 0.0))
+
+    def _recover(self, name: str) -> None:
+        """Hand a failing sensor to the recovery thread"""
+        with self._recovering_lock:
+            self.recovering.add(name)
+        self._recovery_queue.put(name)
+        self._recovery_wake.set()
+
+    def _run_recovery(self) -> None:
+        """Reinitialize failed sensors one at a time so only one is ever
+        at the default address, leaving the others streaming"""
+        while not self._stop_event.is_set():
+            self._recovery_wake.clear()
+            try:
+                name = self._recovery_queue.get_nowait()
+            except queue.Empty:
+                clock.wait(self._recovery_wake, self.recovery_retry_delay)
+                continue
+            device = self.devices[name]
+            try:
+                device.reinitialize()
+            except BaseException as e:
+                # to the back of the queue, so other sensors are not held up
+                print('[!] ToF {} sensor recovery failed, retrying: {}'.format(
+                    name, e))
+                self._recovery_queue.put(name)
+                clock.wait(self._stop_event, self.recovery_retry_delay)
+                continue
+            with self._recovering_lock:
+                self.recovering.discard(name)
+            print('[*] ToF {} sensor recovered'.format(name))
@@ -1,52 +1,87 @@
 import board
-import time
+import os
 import pigpio
+import time
+from typing import FrozenSet, Mapping, Optional, cast
 
+from robot.hardware.drive_output import DriveOutput
+from robot.hardware.tof import TOF
+from robot.hardware.tof_array import TOFArray
 from robot.states.base import BaseStateMachine
+from robot.states.control import control_step
 from robot.states.robot import RobotStateMachine
-from robot.states.state_types import BaseInput, RobotInput
-from robot.utils.init import init_tof, init_subsystems, stop_subsystems
+from robot.states.state_types import BaseInput
+from robot.states.tof_scheduler import TOFScheduler
+from robot.utils import clock
+from robot.utils.init import (
+    init_tof,
+    init_subsystems,
+    stop_subsystems,
+    telemetry_dir
+)
 from robot.utils.play_song import play_song, stop_song
+from robot.utils.scheduler import LoopScheduler
+from robot.utils.telemetry import (
+    FINISH,
+    MOVE_BASE,
+    PAUSEABLE,
+    TelemetryRecord,
+    TelemetryRecorder
+)
 
 
-def run_course():
+def run_course(
+        rate: float = 60,
+        skip_missed: bool = False,
+        time_limit: Optional[float] = None):
     i2c = board.I2C()
     pi = pigpio.pi()
 
-    tof_devices = init_tof(i2c)
+    tof_array = TOFArray(lambda: cast(Mapping[str, TOF], init_tof(i2c, pi)))
+    tof_scheduler = TOFScheduler(tof_array.devices)
     subsystems = init_subsystems(pi, i2c)
     line_follower = subsystems['line_follower']
     left_motor, right_motor = subsystems['left_motor'], subsystems['right_motor']
+    drive = DriveOutput(pi, left_motor, right_motor)
 
     base_state_machine = BaseStateMachine()
     robot_state_machine = RobotStateMachine(
         subsystems['grabber'],
         subsystems['launcher'],
-        subsystems['lift'])
+        subsystems['lift'],
+        rate=rate)
 
     media_player = play_song('/home/pi/Desktop/senior-project/songs/dancing.mp4')
+    scheduler = LoopScheduler(rate, skip_missed)
+    telemetry = TelemetryRecorder(os.path.join(
+        telemetry_dir, time.strftime('run-%Y%m%d-%H%M%S.tlm')))
+    print('[*] Recording telemetry to {}'.format(telemetry.path))
 
     try:
+        tof_array.start()
+        tof_array.wait_for_snapshot()
+        stale_tofs: FrozenSet[str] = frozenset()
+        telemetry.start()
+        scheduler.start()
+        start_time = clock.monotonic()
         while True:
-            try:
-                left_tof = tof_devices['left'].get_distance()
-                middle_tof = tof_devices['middle'].get_distance()
-                right_tof = tof_devices['right'].get_distance()
-                top_tof = tof_devices['top'].get_distance()
-                bottom_tof = tof_devices['bottom'].get_distance()
-            except BaseException:
-                print('[!] ToF error occurred, resetting sensors')
-                left_motor.set_motor_pwm(0)
-                right_motor.set_motor_pwm(0)
-                tof_devices = init_tof(i2c)
-                continue
+            scheduler.wait()
+            now = clock.monotonic()
+            tofs = tof_array.snapshot
+            # wait_for_snapshot has returned, so there always is one
+            assert tofs is not None
+            if tofs.stale != stale_tofs:
+                # keep driving on last known values while sensors recover
+                print('[!] Stale ToF sensors: {}'.format(sorted(tofs.stale)))
+                stale_tofs = tofs.stale
+            left_tof, middle_tof, right_tof = tofs.left, tofs.middle, tofs.right
+            top_tof, bottom_tof = tofs.top, tofs.bottom
             try:
                 line = line_follower.get_sensor_reading_magnitudes()
                 left_line, right_line = line
             except BaseException:
                 print('[!] Line follower array error occurred')
-                left_motor.set_motor_pwm(0)
-                right_motor.set_motor_pwm(0)
+                drive.stop()
                 continue
             base_input: BaseInput = {
                 'stop': False,
@@ -56,47 +91,67 @@ def run_course():
                 'left_line': left_line,
                 'right_line': right_line,
             }
-            old_base_state = base_state_machine.state
-            base_output = base_state_machine.transition(base_input)
+            control = control_step(
+                base_state_machine,
+                robot_state_machine,
+                base_input,
+                top_tof,
+                bottom_tof)
+            base_output = control['base_output']
             new_base_state = base_state_machine.state
-            pauseable = base_output['pauseable']
-            robot_input: RobotInput = {
-                'top_tof': top_tof,
-                'bottom_tof': bottom_tof,
-                'pauseable': pauseable,
-            }
-            old_robot_state = robot_state_machine.state
-            robot_output = robot_state_machine.transition(robot_input)
             new_robot_state = robot_state_machine.state
-            move_base = robot_output['move_base']
+            tof_scheduler.update(new_base_state, new_robot_state, tofs)
+            move_base = control['move_base']
+            left_pwm, right_pwm = control['left_pwm'], control['right_pwm']
             if not move_base:
-                left_motor.set_motor_pwm(0)
-                right_motor.set_motor_pwm(0)
+                drive.set(0, 0)
             else:
-                left_motor.set_motor_pwm(base_output['left_pwm'].value)
-                right_motor.set_motor_pwm(base_output['right_pwm'].value)
-                left_motor.set_direction(base_output['left_dir'].value)
-                right_motor.set_direction(base_output['right_dir'].value)
-            if old_base_state != new_base_state:
-                print('=== State Change Occurred ===')
-                print('{} -> {}'.format(old_base_state, new_base_state))
-            print('BASE: {}: {}'.format(base_state_machine.state, base_input))
-            if old_robot_state != new_robot_state:
-                print('=== State Change Occurred ===')
-                print('{} -> {}'.format(old_robot_state, new_robot_state))
-            print(
-                'ROBOT: {}: {}'.format(
-                    robot_state_machine.state,
-                    robot_input))
-            print('CUP/NET COUNT: {}'.format(robot_state_machine.cup_net_count))
+                drive.set(
+                    left_pwm,
+                    right_pwm,
+                    base_output['left_dir'].value,
+                    base_output['right_dir'].value)
+            stale = 0
+            for bit, name in enumerate(tof_array.sensor_names):
+                if name in tofs.stale:
+                    stale |= 1 << bit
+            flags = (
+                (MOVE_BASE if move_base else 0) |
+                (PAUSEABLE if base_output['pauseable'] else 0) |
+                (FINISH if base_output['finish'] else 0))
+            telemetry.record(TelemetryRecord(
+                scheduler.ticks,
+                now,
+                left_tof,
+                middle_tof,
+                right_tof,
+                top_tof,
+                bottom_tof,
+                left_line,
+                right_line,
+                new_base_state.value,
+                new_robot_state.value,
+                left_pwm,
+                right_pwm,
+                base_output['left_dir'].value,
+                base_output['right_dir'].value,
+                robot_state_machine.cup_net_count,
+                stale,
+                flags))
             finish = base_output['finish']
             if finish:
                 break
-            time.sleep(1 / 60)
+            if time_limit is not None and now - start_time >= time_limit:
+                print('[!] Stopping at the {} s time limit'.format(time_limit))
+                break
     except BaseException as e:
         print(e)
         stop_song(media_player)
         stop_subsystems(subsystems)
+    telemetry.stop()
+    tof_array.stop()
     stop_song(media_player)
     stop_subsystems(subsystems)
     subsystems['lift'].reset()
+    print(scheduler.summary())
+    print(drive.summary())
@@ -0,0 +1,229 @@
+import math
+from typing import List, NamedTuple, Optional, Sequence, Tuple
+
+from robot.utils.persist import load_json, save_json
+
+
+class Pose(NamedTuple):
+    """Position in cm and heading in radians, counterclockwise from +x"""
+    x: float
+    y: float
+    heading: float
+
+
+class Wall(NamedTuple):
+    """Straight wall from (x1, y1) to (x2, y2), seen by sensors mounted
+    below its height"""
+    x1: float
+    y1: float
+    x2: float
+    y2: float
+    height: float = 30.0
+
+
+class Obstacle(NamedTuple):
+    """Round object standing on the course: tree, cup, net or pole"""
+    kind: str
+    x: float
+    y: float
+    radius: float
+    height: float
+
+
+class Pad(NamedTuple):
+    """Rectangle of line colour, such as the finish pad"""
+    x1: float
+    y1: float
+    x2: float
+    y2: float
+
+
+class Course(NamedTuple):
+    """Course layout in cm. The line runs through the points in order."""
+    walls: Tuple[Wall, ...]
+    obstacles: Tuple[Obstacle, ...]
+    line: Tuple[Tuple[float, float], ...]
+    pads: Tuple[Pad, ...]
+    start: Pose
+    line_width: float = 1.9
+
+
+def default_course() -> Course:
+    """A 240 x 180 cm board driven counterclockwise. The line leaves the
+    start east along the south wall, which START drives without looking for
+    objects, then runs north along the east wall past a tree, a cup, a net
+    and a pole, and west along the north wall past the second tree, a cup, a
+    net, a pole and a last cup into the finish bay against the west wall."""
+    return Course(
+        walls=(
+            Wall(0, 0, 240, 0),
+            Wall(240, 0, 240, 180),
+            Wall(240, 180, 0, 180),
+            Wall(0, 180, 0, 0),
+            # south side of the finish bay
+            Wall(0, 149, 40, 149, 10),
+        ),
+        obstacles=(
+            Obstacle('tree', 200, 50, 4, 30),
+            Obstacle('cup', 200, 80, 4, 10),
+            Obstacle('net', 198, 108, 6, 25),
+            Obstacle('pole', 200, 132, 1.5, 40),
+            Obstacle('tree', 170, 141, 4, 30),
+            Obstacle('cup', 135, 141, 4, 10),
+            Obstacle('net', 102, 139, 6, 25),
+            Obstacle('pole', 72, 141, 1.5, 40),
+            Obstacle('cup', 48, 141, 4, 10),
+        ),
+        line=((140, 20), (222, 20), (222, 163), (10, 163)),
+        pads=(Pad(0, 155, 14, 171),),
+        start=Pose(150, 20, 0))
+
+
+def load_course(path: str, default: Course) -> Course:
+    """Load a saved course, falling back to default for anything missing"""
+    data = load_json(path, {})
+    course = default
+    if 'walls' in data:
+        course = course._replace(
+            walls=tuple(Wall(*wall) for wall in data['walls']))
+    if 'obstacles' in data:
+        course = course._replace(
+            obstacles=tuple(Obstacle(*obstacle) for obstacle in data['obstacles']))
+    if 'line' in data:
+        course = course._replace(
+            line=tuple((x, y) for x, y in data['line']))
+    if 'pads' in data:
+        course = course._replace(pads=tuple(Pad(*pad) for pad in data['pads']))
+    if 'start' in data:
+        course = course._replace(start=Pose(*data['start']))
+    if 'line_width' in data:
+        course = course._replace(line_width=data['line_width'])
+    return course
+
+
+def save_course(path: str, course: Course) -> None:
+    save_json(path, {
+        'walls': [list(wall) for wall in course.walls],
+        'obstacles': [list(obstacle) for obstacle in course.obstacles],
+        'line': [list(point) for point in course.line],
+        'pads': [list(pad) for pad in course.pads],
+        'start': list(course.start),
+        'line_width': course.line_width,
+    })
+
+
+def ray_cast(
+        course: Course,
+        x: float,
+        y: float,
+        z: float,
+        angle: float,
+        max_range: float) -> float:
+    """Distance along a ray from (x, y) at height z to the nearest wall or
+    obstacle tall enough to hit, max_range if there is none"""
+    dx, dy = math.cos(angle), math.sin(angle)
+    nearest = max_range
+    for wall in course.walls:
+        if wall.height <= z:
+            continue
+        ex, ey = wall.x2 - wall.x1, wall.y2 - wall.y1
+        denominator = dx * ey - dy * ex
+        if denominator == 0:
+            continue
+        wx, wy = wall.x1 - x, wall.y1 - y
+        distance = (wx * ey - wy * ex) / denominator
+        along = (wx * dy - wy * dx) / denominator
+        if 0 <= distance < nearest and 0 <= along <= 1:
+            nearest = distance
+    for obstacle in course.obstacles:
+        if obstacle.height <= z:
+            continue
+        ox, oy = obstacle.x - x, obstacle.y - y
+        projection = ox * dx + oy * dy
+        miss = ox * ox + oy * oy - projection * projection
+        radius = obstacle.radius * obstacle.radius
+        if miss > radius:
+            continue
+        distance = projection - math.sqrt(radius - miss)
+        if distance < 0 <= projection + math.sqrt(radius - miss):
+            # starting inside the obstacle
+            distance = 0.0
+        if 0 <= distance < nearest:
+            nearest = distance
+    return nearest
+
+
+def _segment_distance(
+        x: float,
+        y: float,
+        start: Tuple[float, float],
+        end: Tuple[float, float]) -> float:
+    """Distance from a point to a line segment"""
+    sx, sy = start
+    ex, ey = end[0] - sx, end[1] - sy
+    length = ex * ex + ey * ey
+    t = 0.0
+    if length:
+        t = min(max(((x - sx) * ex + (y - sy) * ey) / length, 0.0), 1.0)
+    return math.hypot(x - sx - t * ex, y - sy - t * ey)
+
+
+def on_line(course: Course, x: float, y: float) -> bool:
+    """Whether a line sensor over (x, y) sees line colour"""
+    for pad in course.pads:
+        if pad.x1 <= x <= pad.x2 and pad.y1 <= y <= pad.y2:
+            return True
+    half_width = course.line_width / 2
+    for start, end in zip(course.line, course.line[1:]):
+        if _segment_distance(x, y, start, end) <= half_width:
+            return True
+    return False
+
+
+def _segments_cross(
+        a: Tuple[float, float],
+        b: Tuple[float, float],
+        c: Tuple[float, float],
+        d: Tuple[float, float]) -> bool:
+    """Whether segments ab and cd intersect"""
+    def side(p, q, r) -> float:
+        return (q[0] - p[0]) * (r[1] - p[1]) - (q[1] - p[1]) * (r[0] - p[0])
+    return (
+        side(a, b, c) * side(a, b, d) <= 0 and
+        side(c, d, a) * side(c, d, b) <= 0)
+
+
+def footprint_collision(
+        course: Course,
+        corners: Sequence[Tuple[float, float]]) -> Optional[str]:
+    """What a convex footprint given by its corners counterclockwise
+    touches, None if it is clear"""
+    edges: List[Tuple[Tuple[float, float], Tuple[float, float]]] = list(
+        zip(corners, list(corners[1:]) + [corners[0]]))
+    low_x = min(x for x, _ in corners)
+    high_x = max(x for x, _ in corners)
+    low_y = min(y for _, y in corners)
+    high_y = max(y for _, y in corners)
+    for wall in course.walls:
+        # skip anything whose bounding box is clear of the footprint's
+        if (max(wall.x1, wall.x2) < low_x or min(wall.x1, wall.x2) > high_x or
+                max(wall.y1, wall.y2) < low_y or min(wall.y1, wall.y2) > high_y):
+            continue
+        start, end = (wall.x1, wall.y1), (wall.x2, wall.y2)
+        if any(_segments_cross(start, end, a, b) for a, b in edges):
+            return 'wall'
+    for obstacle in course.obstacles:
+        if (obstacle.x + obstacle.radius < low_x or
+                obstacle.x - obstacle.radius > high_x or
+                obstacle.y + obstacle.radius < low_y or
+                obstacle.y - obstacle.radius > high_y):
+            continue
+        inside = all(
+            (b[0] - a[0]) * (obstacle.y - a[1]) -
+            (b[1] - a[1]) * (obstacle.x - a[0]) >= 0
+            for a, b in edges)
+        if inside or any(
+                _segment_distance(obstacle.x, obstacle.y, a, b) < obstacle.radius
+                for a, b in edges):
+            return obstacle.kind
+    return None
@@ -0,0 +1,174 @@
+from typing import Callable, Optional, Sequence
+
+from robot.hardware.linear_actuator import ActuatorModel
+from robot.hardware.motion_profile import MotionProfile
+from robot.subsystems.grabber import Grabber
+from robot.subsystems.launcher import Launcher
+from robot.subsystems.lift import Lift
+
+
+class TimedWait:
+    """Waitable that is done once a time source reaches a deadline"""
+
+    def __init__(self, now: Callable[[], float], until: float) -> None:
+        """Initialize wait ending at until"""
+        self.now = now
+        self.until = until
+        self.error: Optional[BaseException] = None
+
+    @property
+    def done(self) -> bool:
+        return self.now() >= self.until
+
+
+class NullMotor:
+    """Brushed motor that only remembers what it was told"""
+
+    def __init__(self) -> None:
+        """Initialize stopped motor"""
+        self.pwm = 0
+        self.direction = 1
+
+    def set_direction(self, direction: int) -> None:
+        self.direction = direction
+
+    def set_direction_forward(self) -> None:
+        self.direction = 1
+
+    def set_direction_backward(self) -> None:
+        self.direction = 0
+
+    def set_motor_pwm(self, pwm: int) -> None:
+        self.pwm = pwm
+
+    def stop_motor(self) -> None:
+        self.pwm = 0
+
+    def close(self) -> None:
+        pass
+
+
+class ModelActuator:
+    """Linear actuator that moves along an ActuatorModel on a given time
+    source, standing in for LinearActuator"""
+
+    max_pwm: int = 255
+
+    def __init__(self, model: ActuatorModel, now: Callable[[], float]) -> None:
+        """Initialize fully retracted actuator"""
+        self.model = model
+        self.now = now
+        self.target: float = 0
+        self.arrive_time: float = now()
+
+    def remaining_travel(self) -> float:
+        """Seconds until the actuator reaches its commanded extension"""
+        return max(0.0, self.arrive_time - self.now())
+
+    def _command(self, pwm: int, duration: float = 0.0) -> None:
+        """Record a move to pwm taking at least duration seconds, treating
+        a move in progress as already there"""
+        now = self.now()
+        distance = pwm - self.target
+        self.target = pwm
+        self.arrive_time = now + max(duration, self.model.travel_time(distance))
+
+    def set_extension_pwm(self, pwm: int) -> None:
+        self._command(pwm)
+
+    def set_extension_minimum(self) -> None:
+        self._command(0)
+
+    def set_extension_maximum(self) -> None:
+        self._command(self.max_pwm)
+
+    def ramp_extension_pwm(
+            self,
+            start: int,
+            stop: int,
+            step_delay: float) -> TimedWait:
+        """Ramp from start toward stop, stop excluded, like the daemon would"""
+        if stop == start:
+            return TimedWait(self.now, self.now())
+        last = stop - 1 if stop > start else stop + 1
+        self._command(last, abs(stop - start) * step_delay)
+        return TimedWait(self.now, self.arrive_time)
+
+    def close(self) -> None:
+        pass
+
+
+class ModelStepper:
+    """Stepper motor whose moves take as long as their MotionProfile says,
+    standing in for StepperMotor"""
+
+    coils = (0, 1, 2, 3)
+
+    def __init__(self, profile: MotionProfile, now: Callable[[], float]) -> None:
+        """Initialize released stepper"""
+        self.profile = profile
+        self.now = now
+        self.coil: Optional[int] = None
+        self.steps_taken = 0
+
+    def start_path(
+            self,
+            path: Sequence[int],
+            profile: Optional[MotionProfile] = None) -> TimedWait:
+        """Start a path of signed segments, done when it would finish"""
+        if profile is None:
+            profile = self.profile
+        self.steps_taken += sum(abs(steps) for steps in path)
+        duration = sum(profile.duration(abs(steps)) for steps in path)
+        return TimedWait(self.now, self.now() + duration)
+
+    def start_forward(
+            self,
+            steps: int,
+            profile: Optional[MotionProfile] = None) -> TimedWait:
+        return self.start_path([steps], profile)
+
+    def start_backward(
+            self,
+            steps: int,
+            profile: Optional[MotionProfile] = None) -> TimedWait:
+        return self.start_path([-steps], profile)
+
+    def reset_phase(self) -> None:
+        self.coil = None
+
+    def stop(self) -> None:
+        self.coil = None
+
+
+class ModelGrabber(Grabber):
+    """Grabber running its real actions against modelled parts"""
+
+    def __init__(self, actuator_model: ActuatorModel, now: Callable[[], float]) -> None:
+        """Initialize modelled motor and actuator"""
+        super().__init__(
+            None,
+            0,
+            0,
+            0,
+            actuator_model,
+            motor=NullMotor(),
+            actuator=ModelActuator(actuator_model, now))
+
+
+class ModelLauncher(Launcher):
+    """Launcher running its real actions against a modelled motor"""
+
+    def __init__(self) -> None:
+        """Initialize modelled motor"""
+        super().__init__(None, 0, 0, motor=NullMotor())
+
+
+class ModelLift(Lift):
+    """Lift running its real actions against a modelled stepper, starting
+    at the bottom of travel"""
+
+    def __init__(self, profile: MotionProfile, now: Callable[[], float]) -> None:
+        """Initialize modelled stepper without a saved position"""
+        super().__init__(
+            (0, 0), (0, 0), profile=profile, stepper=ModelStepper(profile, now))
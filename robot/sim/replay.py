@@ -0,0 +1,254 @@
+import argparse
+import time
+from typing import Dict, Iterable, List, NamedTuple, Optional, Sequence
+
+if __name__ == '__main__':
+    # the mechanism models subclass the subsystems, which import the
+    # hardware libraries, so stand-ins go in first off the robot
+    from robot.sim.fake_hardware import FakeHardware
+    FakeHardware().install()
+
+from robot.hardware.linear_actuator import ActuatorModel
+from robot.hardware.motion_profile import MotionProfile
+from robot.sim.mechanisms import ModelGrabber, ModelLauncher, ModelLift
+from robot.states.base import BaseStateMachine
+from robot.states.control import control_step
+from robot.states.robot import RobotStateMachine
+from robot.states.state_types import BaseInput, BaseState, ControlOutput, RobotState
+from robot.utils.actions import ActionExecutor
+from robot.utils.telemetry import TelemetryRecord, Transition, read_records
+
+
+class Divergence(NamedTuple):
+    """A run of ticks where a replayed state differs from the reference"""
+    tick: int
+    timestamp: float
+    machine: str
+    expected: str
+    actual: str
+    ticks: int
+
+
+class ReplayResult(NamedTuple):
+    ticks: int
+    # seconds of course covered by the trace and seconds taken to replay it
+    duration: float
+    elapsed: float
+    transitions: List[Transition]
+    divergences: List[Divergence]
+    divergent_ticks: int
+    finished: bool
+
+
+class Replayer:
+    """Drives both state machines from recorded sensor readings, with
+    mechanisms modelled on the trace timestamps instead of moving"""
+
+    def __init__(
+            self,
+            lift_profile: Optional[MotionProfile] = None,
+            actuator_model: Optional[ActuatorModel] = None,
+            rate: float = 60) -> None:
+        """Initialize state machines in their starting states for a trace
+        recorded at rate Hz"""
+        if lift_profile is None:
+            lift_profile = MotionProfile()
+        if actuator_model is None:
+            actuator_model = ActuatorModel()
+        self.now: float = 0.0
+        self.base_state_machine = BaseStateMachine()
+        self.robot_state_machine = RobotStateMachine(
+            ModelGrabber(actuator_model, self.clock),
+            ModelLauncher(),
+            ModelLift(lift_profile, self.clock),
+            ActionExecutor(self.clock),
+            rate)
+
+    def clock(self) -> float:
+        """Timestamp of the tick being replayed"""
+        return self.now
+
+    def set_parameter(self, name: str, value: str) -> None:
+        """Override a RobotStateMachine threshold or advance count"""
+        current = getattr(self.robot_state_machine, name, None)
+        if not isinstance(current, (int, float)) or isinstance(current, bool):
+            raise ValueError(
+                "[!] {} is not a numeric RobotStateMachine parameter".format(name))
+        setattr(self.robot_state_machine, name, type(current)(value))
+
+    def step(self, record: TelemetryRecord) -> ControlOutput:
+        """Run one tick on a record's sensor readings"""
+        base_input: BaseInput = {
+            'stop': False,
+            'left_tof': record.left_tof,
+            'middle_tof': record.middle_tof,
+            'right_tof': record.right_tof,
+            'left_line': record.left_line,
+            'right_line': record.right_line,
+        }
+        return self.advance(
+            record.timestamp, base_input, record.top_tof, record.bottom_tof)
+
+    def advance(
+            self,
+            timestamp: float,
+            base_input: BaseInput,
+            top_tof: float,
+            bottom_tof: float) -> ControlOutput:
+        """Run one tick at timestamp on live sensor readings"""
+        self.now = timestamp
+        return control_step(
+            self.base_state_machine,
+            self.robot_state_machine,
+            base_input,
+            top_tof,
+            bottom_tof)
+
+    def replay(
+            self,
+            records: Iterable[TelemetryRecord],
+            reference: Optional[Iterable[TelemetryRecord]] = None) -> ReplayResult:
+        """Replay records until the base finishes or they run out, comparing
+        states tick by tick with reference, the records themselves if None"""
+        references = iter(reference) if reference is not None else None
+        transitions: List[Transition] = []
+        divergences: List[Divergence] = []
+        # divergence still in progress for each machine
+        open_divergences: Dict[str, Divergence] = {}
+        divergent_ticks = 0
+        previous = {
+            'BASE': self.base_state_machine.state.name,
+            'ROBOT': self.robot_state_machine.state.name,
+        }
+        ticks = 0
+        first: Optional[float] = None
+        finished = False
+        start = time.perf_counter()
+        for record in records:
+            if first is None:
+                first = record.timestamp
+            output = self.step(record)
+            ticks += 1
+            expected_record: Optional[TelemetryRecord] = record
+            if references is not None:
+                expected_record = next(references, None)
+            states = {
+                'BASE': self.base_state_machine.state.name,
+                'ROBOT': self.robot_state_machine.state.name,
+            }
+            expected = None
+            if expected_record is not None:
+                expected = {
+                    'BASE': BaseState(expected_record.base_state).name,
+                    'ROBOT': RobotState(expected_record.robot_state).name,
+                }
+            diverged = False
+            for machine, state in states.items():
+                if state != previous[machine]:
+                    transitions.append(Transition(
+                        record.tick,
+                        record.timestamp,
+                        machine,
+                        previous[machine],
+                        state))
+                    previous[machine] = state
+                if expected is None or state == expected[machine]:
+                    if machine in open_divergences:
+                        divergences.append(open_divergences.pop(machine))
+                    continue
+                diverged = True
+                divergence = open_divergences.get(machine)
+                if divergence is None:
+                    open_divergences[machine] = Divergence(
+                        record.tick,
+                        record.timestamp,
+                        machine,
+                        expected[machine],
+                        state,
+                        1)
+                else:
+                    open_divergences[machine] = divergence._replace(
+                        ticks=divergence.ticks + 1)
+            if diverged:
+                divergent_ticks += 1
+            if output['base_output']['finish']:
+                finished = True
+                break
+        divergences.extend(open_divergences.values())
+        divergences.sort(key=lambda divergence: divergence.tick)
+        return ReplayResult(
+            ticks,
+            self.now - first if first is not None else 0.0,
+            time.perf_counter() - start,
+            transitions,
+            divergences,
+            divergent_ticks,
+            finished)
+
+
+def print_result(result: ReplayResult, transitions: bool = True) -> None:
+    """Print transitions, divergences and a summary of a replay"""
+    if transitions:
+        for transition in result.transitions:
+            print('{:10.3f} {} {} -> {}'.format(
+                transition.timestamp,
+                transition.machine,
+                transition.previous,
+                transition.state))
+    for divergence in result.divergences:
+        print('[!] {:10.3f} tick {} {} expected {} got {} for {} ticks'.format(
+            divergence.timestamp,
+            divergence.tick,
+            divergence.machine,
+            divergence.expected,
+            divergence.actual,
+            divergence.ticks))
+    print('[*] Replayed {} ticks, {:.1f} s of course in {:.3f} s ({:.0f} ticks/s)'
+          .format(
+              result.ticks,
+              result.duration,
+              result.elapsed,
+              result.ticks / result.elapsed if result.elapsed else 0))
+    print('[*] {} divergences over {} ticks, course {}'.format(
+        len(result.divergences),
+        result.divergent_ticks,
+        'finished' if result.finished else 'not finished'))
+
+
+def replay_file(
+        path: str,
+        reference_path: Optional[str] = None,
+        parameters: Sequence[str] = (),
+        lift_profile: Optional[MotionProfile] = None,
+        actuator_model: Optional[ActuatorModel] = None,
+        rate: float = 60) -> ReplayResult:
+    """Replay a telemetry file recorded at rate Hz with NAME=VALUE state
+    machine overrides"""
+    replayer = Replayer(lift_profile, actuator_model, rate)
+    for parameter in parameters:
+        name, _, value = parameter.partition('=')
+        replayer.set_parameter(name, value)
+    with open(path, 'rb') as f:
+        if reference_path is None:
+            return replayer.replay(read_records(f))
+        with open(reference_path, 'rb') as reference:
+            return replayer.replay(read_records(f), read_records(reference))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Replay a telemetry trace through the state machines')
+    parser.add_argument('path')
+    parser.add_argument(
+        '--reference', help='trace to compare states with, default the replayed one')
+    parser.add_argument(
+        '--set', action='append', default=[], metavar='NAME=VALUE',
+        help='override a RobotStateMachine parameter, can be repeated')
+    parser.add_argument(
+        '--rate', type=float, default=60, help='loop rate the trace was recorded at')
+    parser.add_argument(
+        '--quiet', action='store_true', help='skip printing transitions')
+    args = parser.parse_args()
+    print_result(
+        replay_file(args.path, args.reference, args.set, rate=args.rate),
+        not args.quiet)
@@ -0,0 +1,540 @@
+import argparse
+import glob
+import math
+import os
+import random
+import tempfile
+import time
+from typing import Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+from robot.sim.course import (
+    Course,
+    Pose,
+    default_course,
+    footprint_collision,
+    load_course,
+    on_line,
+    ray_cast,
+    save_course
+)
+from robot.sim.fake_hardware import FakeHardware, run_course_on_fake_hardware
+from robot.states.state_types import BaseInput, BaseState, GPIOOutput, RobotState
+from robot.utils import clock
+from robot.utils.telemetry import (
+    FINISH,
+    HEADER,
+    MAGIC,
+    MOVE_BASE,
+    PAUSEABLE,
+    RECORD,
+    VERSION,
+    TelemetryRecord,
+    Transition,
+    read_records
+)
+
+
+class SensorMount(NamedTuple):
+    """ToF sensor position in cm from the middle of the drive axle, x
+    forward and y to the left, at height z, facing angle radians from
+    straight ahead"""
+    name: str
+    x: float
+    y: float
+    z: float
+    angle: float
+
+
+class RobotGeometry(NamedTuple):
+    """Robot dimensions in cm and drive response"""
+    wheel_base: float = 17.0
+    # wheel speed at full duty cycle in cm/s, reached with this time constant
+    max_speed: float = 32.0
+    time_constant: float = 0.05
+    # right wheel speed relative to the left, below 1 pulls to the right
+    right_gain: float = 1.0
+    # footprint around the axle
+    front: float = 9.5
+    back: float = 10.0
+    width: float = 18.0
+    # line sensors sit in a row across the robot this far ahead of the axle
+    line_offset: float = 10.0
+    line_spacing: float = 0.95
+    line_sensors: int = 8
+    tof_mounts: Tuple[SensorMount, ...] = (
+        SensorMount('left', 0, 9, 3, math.pi / 2),
+        SensorMount('middle', 9.5, 0, 3, 0),
+        SensorMount('right', 0, -9, 3, -math.pi / 2),
+        SensorMount('top', 2, 9, 16, math.pi / 2),
+        SensorMount('bottom', 2, 9, 6, math.pi / 2),
+    )
+    # each reading is the nearest of tof_rays rays spread over the field of view
+    tof_fov: float = math.radians(27)
+    tof_rays: int = 7
+    tof_range: float = 400.0
+
+
+class LapResult(NamedTuple):
+    finished: bool
+    # finished, time limit or what the robot collided with
+    reason: str
+    # seconds of course time until the lap ended, and seconds taken to run it
+    lap_time: float
+    elapsed: float
+    ticks: int
+    distance: float
+    trees: int
+    cups: int
+    nets: int
+    transitions: List[Transition]
+
+
+def line_magnitudes(readings: Sequence[int]) -> Tuple[int, int]:
+    """Left and right magnitudes of line readings, weighted toward the ends
+    as LineFollowArray does"""
+    half = len(readings) // 2
+    left = sum(
+        reading * (index + 1)
+        for index, reading in enumerate(readings[half - 1::-1]))
+    right = sum(
+        reading * (index + 1)
+        for index, reading in enumerate(readings[half:]))
+    return (left, right)
+
+
+class CourseSimulator:
+    """Drives a differential drive robot around a course from motor
+    commands and works out what its sensors see"""
+
+    # the base state machine drives a wheel forward with its direction high
+    forward_level: int = GPIOOutput.HIGH.value
+    # cm/s from its target below which a wheel counts as at speed
+    settled: float = 0.01
+
+    def __init__(
+            self,
+            course: Course,
+            geometry: RobotGeometry = RobotGeometry(),
+            noise: float = 0.5,
+            seed: int = 0) -> None:
+        """Initialize robot stopped at the course start, with ToF readings
+        off by up to noise cm standard deviation"""
+        self.course = course
+        self.geometry = geometry
+        self.noise = noise
+        self.random = random.Random(seed)
+        self.pose: Pose = course.start
+        self.speeds = [0.0, 0.0]
+        self.targets = [0.0, 0.0]
+        self.distance = 0.0
+        self.collision: Optional[str] = None
+
+    def command(
+            self,
+            left_pwm: int,
+            right_pwm: int,
+            left_direction: int,
+            right_direction: int) -> None:
+        """Set wheel duty cycles and direction levels"""
+        gains = (1.0, self.geometry.right_gain)
+        commands = ((left_pwm, left_direction), (right_pwm, right_direction))
+        for index, (pwm, direction) in enumerate(commands):
+            sign = 1 if direction == self.forward_level else -1
+            self.targets[index] = (
+                sign * gains[index] * self.geometry.max_speed * pwm / 255)
+
+    def advance(self, seconds: float, steps: int = 1) -> None:
+        """Move the robot on for seconds in steps, stopping it on contact"""
+        if self.collision is not None or seconds <= 0:
+            return
+        geometry = self.geometry
+        dt = seconds / steps
+        blend = 1.0
+        if geometry.time_constant > 0:
+            blend = 1 - math.exp(-dt / geometry.time_constant)
+        for _ in range(steps):
+            for index in range(2):
+                self.speeds[index] += (
+                    self.targets[index] - self.speeds[index]) * blend
+                if abs(self.targets[index] - self.speeds[index]) < self.settled:
+                    self.speeds[index] = self.targets[index]
+            left, right = self.speeds
+            if left == right == 0:
+                return
+            speed = (left + right) / 2
+            turn_rate = (right - left) / geometry.wheel_base
+            x, y, heading = self.pose
+            middle = heading + turn_rate * dt / 2
+            pose = Pose(
+                x + speed * dt * math.cos(middle),
+                y + speed * dt * math.sin(middle),
+                heading + turn_rate * dt)
+            collision = footprint_collision(self.course, self.footprint(pose))
+            if collision is not None:
+                self.collision = collision
+                self.speeds = [0.0, 0.0]
+                return
+            self.pose = pose
+            self.distance += abs(speed) * dt
+
+    def to_course(self, pose: Pose, x: float, y: float) -> Tuple[float, float]:
+        """Course position of a point given relative to the robot"""
+        cos, sin = math.cos(pose.heading), math.sin(pose.heading)
+        return (pose.x + x * cos - y * sin, pose.y + x * sin + y * cos)
+
+    def footprint(self, pose: Pose) -> List[Tuple[float, float]]:
+        """Corners of the robot counterclockwise"""
+        geometry = self.geometry
+        half = geometry.width / 2
+        return [
+            self.to_course(pose, x, y)
+            for x, y in (
+                (-geometry.back, -half),
+                (geometry.front, -half),
+                (geometry.front, half),
+                (-geometry.back, half))]
+
+    def measure(self, mount: SensorMount) -> float:
+        """Distance in cm one ToF sensor reads from where the robot is"""
+        geometry = self.geometry
+        x, y = self.to_course(self.pose, mount.x, mount.y)
+        facing = self.pose.heading + mount.angle
+        distance = geometry.tof_range
+        for ray in range(geometry.tof_rays):
+            offset = 0.0
+            if geometry.tof_rays > 1:
+                offset = geometry.tof_fov * (ray / (geometry.tof_rays - 1) - 0.5)
+            distance = min(distance, ray_cast(
+                self.course, x, y, mount.z, facing + offset, geometry.tof_range))
+        if self.noise:
+            distance += self.random.gauss(0, self.noise)
+        return min(max(distance, 0.0), geometry.tof_range)
+
+    def tof_readings(self) -> Dict[str, float]:
+        return {
+            mount.name: self.measure(mount) for mount in self.geometry.tof_mounts}
+
+    def line_readings(self) -> List[int]:
+        """Line sensor readings from left to right, 1 over the line, in the
+        order LineFollowArray.read_sensors gives them"""
+        geometry = self.geometry
+        middle = (geometry.line_sensors - 1) / 2
+        readings = []
+        for index in range(geometry.line_sensors):
+            x, y = self.to_course(
+                self.pose,
+                geometry.line_offset,
+                (middle - index) * geometry.line_spacing)
+            readings.append(1 if on_line(self.course, x, y) else 0)
+        return readings
+
+    def attach(self, hardware: FakeHardware, interval: float = 0.005) -> None:
+        """Feed fake hardware sensors from the course and move the robot with
+        the motor outputs of the fake pigpio daemon every interval seconds"""
+        for mount in self.geometry.tof_mounts:
+            hardware.tofs[mount.name].source = (
+                lambda mount=mount: self.measure(mount))
+        hardware.set_line_readings(self.line_readings())
+        clock.start_thread(
+            lambda: self._follow(hardware, interval), 'course-physics')
+
+    def _follow(self, hardware: FakeHardware, interval: float) -> None:
+        from robot.utils import init
+        pi = hardware.pi
+        last = clock.monotonic()
+        while True:
+            now = clock.monotonic()
+            self.advance(now - last)
+            last = now
+            self.command(
+                pi.duty_cycles[init.left_pwm_pin],
+                pi.duty_cycles[init.right_pwm_pin],
+                pi.levels[init.left_dir_pin],
+                pi.levels[init.right_dir_pin])
+            hardware.set_line_readings(self.line_readings())
+            clock.sleep(interval)
+
+
+def _note_transitions(
+        transitions: List[Transition],
+        previous: Dict[str, str],
+        tick: int,
+        timestamp: float,
+        base_state: BaseState,
+        robot_state: RobotState) -> None:
+    """Append a transition for each machine whose state changed"""
+    for machine, state in (('BASE', base_state.name), ('ROBOT', robot_state.name)):
+        if state != previous.get(machine, state):
+            transitions.append(
+                Transition(tick, timestamp, machine, previous[machine], state))
+        previous[machine] = state
+
+
+def _count_entries(transitions: Sequence[Transition], state: RobotState) -> int:
+    return sum(
+        1 for transition in transitions
+        if transition.machine == 'ROBOT' and transition.state == state.name)
+
+
+def run_lap(
+        course: Course,
+        geometry: RobotGeometry = RobotGeometry(),
+        rate: float = 60,
+        time_limit: float = 180,
+        parameters: Sequence[str] = (),
+        noise: float = 0.5,
+        seed: int = 0,
+        tof_period: float = 0.033,
+        physics_steps: int = 4,
+        telemetry_path: Optional[str] = None) -> LapResult:
+    """Run the state machines around a course in closed loop, each tick
+    sensing from where the robot is and moving it with the drive command.
+    ToF readings refresh every tof_period seconds, mechanisms take as long
+    as their models say, and NAME=VALUE parameters override RobotStateMachine
+    thresholds as in replay. The hardware libraries must be importable, or
+    faked with FakeHardware.install."""
+    # the mechanism models import the hardware libraries, so they are only
+    # imported once any fakes are in place
+    from robot.sim.replay import Replayer
+    simulator = CourseSimulator(course, geometry, noise, seed)
+    replayer = Replayer(rate=rate)
+    for parameter in parameters:
+        name, _, value = parameter.partition('=')
+        replayer.set_parameter(name, value)
+    period = 1 / rate
+    transitions: List[Transition] = []
+    previous = {
+        'BASE': replayer.base_state_machine.state.name,
+        'ROBOT': replayer.robot_state_machine.state.name,
+    }
+    tofs: Dict[str, float] = {}
+    next_measurement = 0.0
+    # direction pins start low and hold while the base is paused
+    left_dir = right_dir = 0
+    finished = False
+    reason = 'time limit'
+    tick = 0
+    now = 0.0
+    telemetry = open(telemetry_path, 'wb') if telemetry_path else None
+    start = time.perf_counter()
+    try:
+        if telemetry is not None:
+            telemetry.write(HEADER.pack(MAGIC, VERSION, RECORD.size))
+        while now < time_limit:
+            now = tick * period
+            if now >= next_measurement:
+                tofs = simulator.tof_readings()
+                next_measurement += tof_period
+            left_line, right_line = line_magnitudes(simulator.line_readings())
+            base_input: BaseInput = {
+                'stop': False,
+                'left_tof': tofs['left'],
+                'middle_tof': tofs['middle'],
+                'right_tof': tofs['right'],
+                'left_line': left_line,
+                'right_line': right_line,
+            }
+            control = replayer.advance(
+                now, base_input, tofs['top'], tofs['bottom'])
+            base_output = control['base_output']
+            if control['move_base']:
+                left_dir = base_output['left_dir'].value
+                right_dir = base_output['right_dir'].value
+            simulator.command(
+                control['left_pwm'], control['right_pwm'], left_dir, right_dir)
+            base_state = replayer.base_state_machine.state
+            robot_state = replayer.robot_state_machine.state
+            _note_transitions(
+                transitions, previous, tick, now, base_state, robot_state)
+            if telemetry is not None:
+                flags = (
+                    (MOVE_BASE if control['move_base'] else 0) |
+                    (PAUSEABLE if base_output['pauseable'] else 0) |
+                    (FINISH if base_output['finish'] else 0))
+                telemetry.write(RECORD.pack(*TelemetryRecord(
+                    tick,
+                    now,
+                    tofs['left'],
+                    tofs['middle'],
+                    tofs['right'],
+                    tofs['top'],
+                    tofs['bottom'],
+                    left_line,
+                    right_line,
+                    base_state.value,
+                    robot_state.value,
+                    control['left_pwm'],
+                    control['right_pwm'],
+                    base_output['left_dir'].value,
+                    base_output['right_dir'].value,
+                    replayer.robot_state_machine.cup_net_count,
+                    0,
+                    flags)))
+            tick += 1
+            if base_output['finish']:
+                finished = True
+                reason = 'finished'
+                break
+            simulator.advance(period, physics_steps)
+            if simulator.collision is not None:
+                reason = 'collided with {}'.format(simulator.collision)
+                break
+    finally:
+        if telemetry is not None:
+            telemetry.close()
+    return LapResult(
+        finished,
+        reason,
+        now,
+        time.perf_counter() - start,
+        tick,
+        simulator.distance,
+        _count_entries(transitions, RobotState.GRAB),
+        _count_entries(transitions, RobotState.DROP),
+        _count_entries(transitions, RobotState.LAUNCH),
+        transitions)
+
+
+def run_lap_on_fake_hardware(
+        course: Course,
+        geometry: RobotGeometry = RobotGeometry(),
+        rate: float = 60,
+        time_limit: float = 180,
+        noise: float = 0.5,
+        seed: int = 0,
+        state_dir: Optional[str] = None) -> LapResult:
+    """Run the real run_course around a course on fake hardware in virtual
+    time, so sensor timing, filtering and bus traffic are all included"""
+    simulator = CourseSimulator(course, geometry, noise, seed)
+    if state_dir is None:
+        state_dir = tempfile.mkdtemp(prefix='robot-')
+    start = time.perf_counter()
+    run_course_on_fake_hardware(
+        time_limit, rate, state_dir, virtual=True, setup=simulator.attach)
+    elapsed = time.perf_counter() - start
+    path = sorted(glob.glob(os.path.join(state_dir, 'logs', '*.tlm')))[-1]
+    with open(path, 'rb') as f:
+        records = list(read_records(f))
+    transitions: List[Transition] = []
+    previous: Dict[str, str] = {}
+    for record in records:
+        _note_transitions(
+            transitions,
+            previous,
+            record.tick,
+            record.timestamp - records[0].timestamp,
+            BaseState(record.base_state),
+            RobotState(record.robot_state))
+    finished = bool(records) and bool(records[-1].flags & FINISH)
+    reason = 'finished' if finished else 'time limit'
+    if simulator.collision is not None:
+        reason = 'collided with {}'.format(simulator.collision)
+    return LapResult(
+        finished,
+        reason,
+        records[-1].timestamp - records[0].timestamp if records else 0.0,
+        elapsed,
+        len(records),
+        simulator.distance,
+        _count_entries(transitions, RobotState.GRAB),
+        _count_entries(transitions, RobotState.DROP),
+        _count_entries(transitions, RobotState.LAUNCH),
+        transitions)
+
+
+def print_result(result: LapResult, transitions: bool = True) -> None:
+    """Print transitions and a summary of a lap"""
+    if transitions:
+        for transition in result.transitions:
+            print('{:10.3f} {} {} -> {}'.format(
+                transition.timestamp,
+                transition.machine,
+                transition.previous,
+                transition.state))
+    print('[{}] {} after {:.2f} s, {:.0f} cm driven, {} trees, {} cups, '
+          '{} nets ({} ticks in {:.2f} s)'.format(
+              '*' if result.finished else '!',
+              result.reason.capitalize(),
+              result.lap_time,
+              result.distance,
+              result.trees,
+              result.cups,
+              result.nets,
+              result.ticks,
+              result.elapsed))
+
+
+def print_summary(results: Sequence[LapResult]) -> None:
+    """Print success rate and lap times over several laps"""
+    lap_times = [result.lap_time for result in results if result.finished]
+    print('[*] {}/{} laps finished'.format(len(lap_times), len(results)))
+    if lap_times:
+        print('[*] Lap time mean {:.2f} s, min {:.2f} s, max {:.2f} s'.format(
+            sum(lap_times) / len(lap_times), min(lap_times), max(lap_times)))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Drive the state machines around a simulated course')
+    parser.add_argument(
+        '--course', help='course layout JSON, default the built in course')
+    parser.add_argument(
+        '--save-course', metavar='PATH',
+        help='write the course layout as JSON to start a new one from')
+    parser.add_argument('--rate', type=float, default=60)
+    parser.add_argument('--time-limit', type=float, default=180)
+    parser.add_argument(
+        '--set', action='append', default=[], metavar='NAME=VALUE',
+        help='override a RobotStateMachine parameter, can be repeated')
+    parser.add_argument(
+        '--noise', type=float, default=0.5,
+        help='ToF noise standard deviation in cm')
+    parser.add_argument(
+        '--right-gain', type=float, default=1.0,
+        help='right wheel speed relative to the left')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument(
+        '--runs', type=int, default=1, help='laps to run with successive seeds')
+    parser.add_argument('--telemetry', help='write a telemetry trace of the lap')
+    parser.add_argument(
+        '--hardware', action='store_true',
+        help='run the real run_course on fake hardware instead')
+    parser.add_argument('--state-dir', help='state directory for --hardware')
+    parser.add_argument(
+        '--quiet', action='store_true', help='skip printing transitions')
+    args = parser.parse_args()
+    if args.hardware and args.runs > 1:
+        parser.error('--hardware runs one lap per process')
+    if not args.hardware:
+        FakeHardware().install()
+    course = default_course()
+    if args.course:
+        course = load_course(args.course, course)
+    if args.save_course:
+        save_course(args.save_course, course)
+    geometry = RobotGeometry(right_gain=args.right_gain)
+    results = []
+    for seed in range(args.seed, args.seed + args.runs):
+        if args.hardware:
+            result = run_lap_on_fake_hardware(
+                course,
+                geometry,
+                args.rate,
+                args.time_limit,
+                args.noise,
+                seed,
+                args.state_dir)
+        else:
+            result = run_lap(
+                course,
+                geometry,
+                args.rate,
+                args.time_limit,
+                args.set,
+                args.noise,
+                seed,
+                telemetry_path=args.telemetry)
+        print_result(result, not args.quiet and args.runs == 1)
+        results.append(result)
+    if args.runs > 1:
+        print_summary(results)
@@ -0,0 +1,28 @@
+from robot.states.base import BaseStateMachine
+from robot.states.robot import RobotStateMachine
+from robot.states.state_types import BaseInput, ControlOutput, RobotInput
+
+
+def control_step(
+        base_state_machine: BaseStateMachine,
+        robot_state_machine: RobotStateMachine,
+        base_input: BaseInput,
+        top_tof: float,
+        bottom_tof: float) -> ControlOutput:
+    """Advance both state machines one tick, the base first so the robot
+    only pauses it where it is pauseable, and work out the drive command"""
+    base_output = base_state_machine.transition(base_input)
+    robot_input: RobotInput = {
+        'top_tof': top_tof,
+        'bottom_tof': bottom_tof,
+        'pauseable': base_output['pauseable'],
+    }
+    robot_output = robot_state_machine.transition(robot_input)
+    move_base = robot_output['move_base']
+    return {
+        'base_output': base_output,
+        'robot_output': robot_output,
+        'move_base': move_base,
+        'left_pwm': base_output['left_pwm'].value if move_base else 0,
+        'right_pwm': base_output['right_pwm'].value if move_base else 0,
+    }
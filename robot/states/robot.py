@@ -1,4 +1,4 @@
-from typing import Callable, Dict
+from typing import Callable, Dict, FrozenSet, Optional
 
 from robot.states.state_types import (
     RobotInput,
@@ -8,6 +8,8 @@ from robot.states.state_types import (
 from robot.subsystems.grabber import Grabber
 from robot.subsystems.launcher import Launcher
 from robot.subsystems.lift import Lift
+from robot.utils.action_graph import ActionGraph, ActionNode
+from robot.utils.actions import Action, ActionExecutor
 
 
 class RobotStateMachine():
@@ -16,10 +18,14 @@ class RobotStateMachine():
     bottom_detection_threshold: float = 18
     top_detection_threshold: float = 23.5
     rejection_threshold: float = 25.0
-    tree_advance: int = 10
-    second_tree_advance: int = 14
-    cup_advance: int = 20
-    net_advance: int = 4
+    # seconds the base keeps moving past an object before stopping for it,
+    # counted in ticks at the loop rate
+    tree_advance: float = 0.167
+    second_tree_advance: float = 0.233
+    cup_advance: float = 0.333
+    net_advance: float = 0.067
+    # where the lift heads while the base is still closing on a tree
+    prestage_lift_position: int = Lift.rise_position
 
     outputs: Dict[RobotState, RobotOutput] = {
         RobotState.EXPECT_TREE: {
@@ -63,6 +69,9 @@ class RobotStateMachine():
         },
         RobotState.IGNORE_POLE: {
             'move_base': True
+        },
+        RobotState.BUSY: {
+            'move_base': False,
         }
     }
 
@@ -70,8 +79,12 @@ class RobotStateMachine():
             self,
             grabber: Grabber,
             launcher: Launcher,
-            lift: Lift):
-        """Initialize starting state, state transition dictionary, and subsystems"""
+            lift: Lift,
+            executor: Optional[ActionExecutor] = None,
+            rate: float = 60):
+        """Initialize starting state, state transition dictionary, and
+        subsystems for a control loop ticking at rate Hz"""
+        self.rate = rate
         self.cup_net_count: int = 0
         self.tree_count: int = 0
         self.advance_count: int = 0
@@ -79,6 +92,80 @@ class RobotStateMachine():
         self.launcher: Launcher = launcher
         self.lift: Lift = lift
         self.state: RobotState = RobotState.EXPECT_TREE
+        if executor is None:
+            executor = ActionExecutor()
+        self.executor: ActionExecutor = executor
+        # state to enter once the action running in BUSY completes
+        self.resume_state: RobotState = RobotState.EXPECT_TREE
+        # runs motions started early in the ADVANCE states, the graphs
+        # wait for it to release any resources they share
+        self.prestager: ActionExecutor = ActionExecutor(executor.now)
+        self.prestage_resources: FrozenSet[str] = frozenset()
+        self.grab_graph = ActionGraph([
+            ActionNode(
+                'rise',
+                lambda: self.lift.move_to_action(self.lift.rise_position),
+                resources=frozenset({'lift'})),
+            ActionNode(
+                'grab',
+                self.grabber.grab_action,
+                after=('rise',),
+                resources=frozenset({'actuator', 'coil'})),
+            ActionNode(
+                'increment',
+                self.lift.increment_action,
+                after=('grab',),
+                resources=frozenset({'lift'})),
+            ActionNode(
+                'clear',
+                self.lift.clear_action,
+                after=('increment',),
+                resources=frozenset({'lift'})),
+            # once the hook is clear the actuator can pull back while the
+            # lift drops to run height
+            ActionNode(
+                'retract',
+                self.grabber.retract_action,
+                after=('clear',),
+                resources=frozenset({'actuator'})),
+            ActionNode(
+                'lower',
+                self.lift.lower_action,
+                after=('clear',),
+                resources=frozenset({'lift'})),
+        ])
+        self.drop_graph = ActionGraph([
+            ActionNode(
+                'extend',
+                self.grabber.extend_to_cup_action,
+                resources=frozenset({'actuator'})),
+            ActionNode(
+                'dispense',
+                self.grabber.dispense_beads_action,
+                after=('extend',),
+                resources=frozenset({'coil'})),
+            ActionNode(
+                'retract',
+                self.grabber.retract_action,
+                after=('dispense',),
+                resources=frozenset({'actuator'})),
+        ])
+        self.launch_graph = ActionGraph([
+            ActionNode(
+                'spin_up',
+                self.launcher.spin_up_action,
+                resources=frozenset({'launcher'})),
+            ActionNode(
+                'dispense',
+                self.grabber.dispense_beads_action,
+                after=('spin_up',),
+                resources=frozenset({'coil'})),
+            ActionNode(
+                'spin_down',
+                self.launcher.stop_action,
+                after=('dispense',),
+                resources=frozenset({'launcher'})),
+        ])
         self.transitions: Dict[RobotState, Callable[[RobotInput], None]] = {
             RobotState.EXPECT_TREE: self.transition_from_expect_tree,
             RobotState.ADVANCE_TREE: self.transition_from_advance_tree,
@@ -94,13 +181,45 @@ class RobotStateMachine():
             RobotState.IGNORE_CUP_NET: self.transition_from_ignore_cup_net,
             RobotState.EXPECT_POLE: self.transition_from_expect_pole,
             RobotState.IGNORE_POLE: self.transition_from_ignore_pole,
+            RobotState.BUSY: self.transition_from_busy,
         }
 
     def transition(self, input: RobotInput) -> RobotOutput:
         """Perform transition and return output of new state"""
+        self.prestager.step()
         self.transitions[self.state](input)
         return self.outputs[self.state]
 
+    def start_action(self, action: Action, resume_state: RobotState) -> None:
+        """Run a mechanism action in BUSY, then continue in resume_state"""
+        self.resume_state = resume_state
+        self.state = RobotState.BUSY
+        self.executor.start(action)
+
+    def start_graph(self, graph: ActionGraph, resume_state: RobotState) -> None:
+        """Run a mechanism graph in BUSY once prestaging frees its resources"""
+        self.start_action(
+            graph.run(self.executor.now, self.held_resources), resume_state)
+
+    def start_prestage(self, action: Action, resources: FrozenSet[str]) -> None:
+        """Start a motion early, skipped if one is already running"""
+        if self.prestager.busy:
+            return
+        self.prestage_resources = resources
+        self.prestager.start(action)
+
+    def held_resources(self) -> FrozenSet[str]:
+        """Resources locked by a running prestage motion"""
+        if self.prestager.busy:
+            return self.prestage_resources
+        return frozenset()
+
+    def transition_from_busy(self, input: RobotInput) -> None:
+        """Transition from BUSY state to next state"""
+        self.executor.step()
+        if not self.executor.busy:
+            self.state = self.resume_state
+
     def transition_from_expect_tree(self, input: RobotInput) -> None:
         """Transition from EXPECT_TREE state to next state"""
         top_tof, bottom_tof = input['top_tof'], input['bottom_tof']
@@ -110,13 +229,20 @@ class RobotStateMachine():
         if (top_tof < self.top_detection_threshold and bottom_tof <
                 self.bottom_detection_threshold):
             self.state = RobotState.ADVANCE_TREE
+            self.start_prestage(
+                self.lift.move_to_action(self.prestage_lift_position),
+                frozenset({'lift'}))
+
+    def advanced(self, seconds: float) -> bool:
+        """Whether the ADVANCE state has lasted longer than seconds"""
+        return self.advance_count > round(seconds * self.rate)
 
     def transition_from_advance_tree(self, input: RobotInput) -> None:
         """Transition from ADVANCE_TREE state to next state"""
         self.advance_count += 1
-        if self.tree_count == 0 and self.advance_count > self.tree_advance:
+        if self.tree_count == 0 and self.advanced(self.tree_advance):
             self.state = RobotState.READY_GRAB
-        elif self.tree_count > 0 and self.advance_count > self.second_tree_advance:
+        elif self.tree_count > 0 and self.advanced(self.second_tree_advance):
             self.state = RobotState.READY_GRAB
 
     def transition_from_ready_grab(self, input: RobotInput) -> None:
@@ -126,17 +252,8 @@ class RobotStateMachine():
 
     def transition_from_grab(self, input: RobotInput) -> None:
         """Transition from GRAB state to next state"""
-        if (self.cup_net_count == 0):
-            self.lift.initial_rise()
-        else:
-            self.lift.second_rise()
-        self.grabber.grab()
-        self.lift.incremement()
-        self.grabber.retract()
-        self.lift.clear()
-        self.lift.lower()
+        self.start_graph(self.grab_graph, RobotState.EXPECT_CUP_NET)
         self.tree_count += 1
-        self.state = RobotState.EXPECT_CUP_NET
 
     def transition_from_expect_cup_net(self, input: RobotInput) -> None:
         """Transition from EXPECT_CUP_NET state to next state"""
@@ -151,20 +268,24 @@ class RobotStateMachine():
                 self.top_detection_threshold):
             self.cup_net_count += 1
             self.state = RobotState.ADVANCE_NET
+            self.start_prestage(
+                self.launcher.spin_up_action(), frozenset({'launcher'}))
         elif (bottom_tof < self.bottom_detection_threshold):
             self.cup_net_count += 1
             self.state = RobotState.ADVANCE_CUP
+            self.start_prestage(
+                self.grabber.prestage_cup_action(), frozenset({'actuator'}))
 
     def transition_from_advance_cup(self, input: RobotInput) -> None:
         """Transition from ADVANCE_CUP state to next state"""
         self.advance_count += 1
-        if self.advance_count > self.cup_advance:
+        if self.advanced(self.cup_advance):
             self.state = RobotState.READY_DROP
 
     def transition_from_advance_net(self, input: RobotInput) -> None:
         """Transition from ADVANCE_CUP state to next state"""
         self.advance_count += 1
-        if self.advance_count > self.net_advance:
+        if self.advanced(self.net_advance):
             self.state = RobotState.READY_LAUNCH
 
     def transition_from_ready_drop(self, input: RobotInput) -> None:
@@ -174,10 +295,7 @@ class RobotStateMachine():
 
     def transition_from_drop(self, input: RobotInput) -> None:
         """Transition from DROP state to next state"""
-        self.grabber.extend_to_cup()
-        self.grabber.dispense_beads()
-        self.grabber.retract()
-        self.state = RobotState.IGNORE_CUP_NET
+        self.start_graph(self.drop_graph, RobotState.IGNORE_CUP_NET)
 
     def transition_from_ready_launch(self, input: RobotInput) -> None:
         """Transition from READY_LAUNCH state to next state"""
@@ -186,10 +304,7 @@ class RobotStateMachine():
 
     def transition_from_launch(self, input: RobotInput) -> None:
         """Transition from LAUNCH state to next state"""
-        self.launcher.run()
-        self.grabber.dispense_beads()
-        self.launcher.stop()
-        self.state = RobotState.IGNORE_CUP_NET
+        self.start_graph(self.launch_graph, RobotState.IGNORE_CUP_NET)
 
     def transition_from_ignore_cup_net(self, input: RobotInput) -> None:
         """Transition from IGNORE_CUP_NET state to next state"""
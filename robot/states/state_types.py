@@ -59,6 +59,7 @@ class RobotState(Enum):
     IGNORE_CUP_NET = 11
     EXPECT_POLE = 12
     IGNORE_POLE = 13
+    BUSY = 14
 
 
 class RobotInput(TypedDict):
@@ -69,3 +70,11 @@ class RobotInput(TypedDict):
 
 class RobotOutput(TypedDict):
     move_base: bool
+
+
+class ControlOutput(TypedDict):
+    base_output: BaseOutput
+    robot_output: RobotOutput
+    move_base: bool
+    left_pwm: int
+    right_pwm: int
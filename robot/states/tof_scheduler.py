@@ -0,0 +1,90 @@
+from typing import Dict, FrozenSet, Mapping, NamedTuple, Optional, Union
+
+from robot.hardware.tof import TOF, RangingProfile
+from robot.hardware.tof_array import TOFSnapshot
+from robot.states.state_types import BaseState, RobotState
+
+State = Union[BaseState, RobotState]
+
+
+class SensorSchedule(NamedTuple):
+    """When a sensor should range fast. The near profile is used in the
+    given states once the distance drops below near_distance, until it
+    rises above far_distance. With no distances, the near profile is used
+    for as long as the machine stays in one of the states."""
+    states: FrozenSet[State]
+    near_distance: Optional[float] = None
+    far_distance: Optional[float] = None
+
+
+class TOFScheduler:
+    """Adjusts each sensor's distance mode and timing budget to what the
+    state machines are currently looking for"""
+
+    near_profile = RangingProfile(1, 20, 20)
+    far_profile = RangingProfile(2, 100, 100)
+
+    schedules: Dict[str, SensorSchedule] = {
+        # closing on the wall ahead, STRAIGHT turns or stops below 9 cm
+        'middle': SensorSchedule(
+            frozenset({BaseState.START, BaseState.STRAIGHT}), 30, 40),
+        # side walls decide turns and the finish box below 20 cm
+        'left': SensorSchedule(frozenset({BaseState.STRAIGHT}), 30, 40),
+        'right': SensorSchedule(frozenset({BaseState.STRAIGHT}), 30, 40),
+        # trees, cups, nets and poles pass by quickly within 25 cm
+        'top': SensorSchedule(frozenset({
+            RobotState.EXPECT_TREE,
+            RobotState.EXPECT_CUP_NET,
+            RobotState.IGNORE_CUP_NET,
+            RobotState.EXPECT_POLE,
+            RobotState.IGNORE_POLE,
+        })),
+        'bottom': SensorSchedule(frozenset({
+            RobotState.EXPECT_TREE,
+            RobotState.EXPECT_CUP_NET,
+            RobotState.IGNORE_CUP_NET,
+            RobotState.EXPECT_POLE,
+            RobotState.IGNORE_POLE,
+        })),
+    }
+
+    def __init__(self, devices: Mapping[str, TOF]) -> None:
+        """Initialize with every sensor on the far profile"""
+        self.devices = devices
+        self.near: Dict[str, bool] = {name: False for name in self.schedules}
+
+    def update(
+            self,
+            base_state: BaseState,
+            robot_state: RobotState,
+            snapshot: TOFSnapshot) -> None:
+        """Request a new profile for any sensor whose needs changed"""
+        for name, schedule in self.schedules.items():
+            near = self._wants_near(
+                schedule,
+                base_state in schedule.states or robot_state in schedule.states,
+                getattr(snapshot, name),
+                self.near[name])
+            if near != self.near[name]:
+                self.near[name] = near
+                profile = self.near_profile if near else self.far_profile
+                self.devices[name].request_profile(profile)
+
+    @staticmethod
+    def _wants_near(
+            schedule: SensorSchedule,
+            in_state: bool,
+            distance: float,
+            near: bool) -> bool:
+        """Decide a sensor's profile with hysteresis on distance"""
+        if not in_state:
+            return False
+        if schedule.near_distance is None:
+            return True
+        if 0 < distance < schedule.near_distance:
+            return True
+        if distance == 0:
+            return False
+        if schedule.far_distance is not None and distance > schedule.far_distance:
+            return False
+        return near
@@ -1,8 +1,9 @@
 import pigpio
-import time
+from typing import Optional
 
-from robot.hardware.brushed_motor import BrushedMotor
-from robot.hardware.linear_actuator import LinearActuator
+from robot.hardware.brushed_motor import BrushedMotor, Motor
+from robot.hardware.linear_actuator import Actuator, ActuatorModel, LinearActuator
+from robot.utils.actions import Action, run_action
 
 
 class Grabber:
@@ -14,10 +15,10 @@ class Grabber:
     grab_motor_pwm: int = 180
     grab_extension_delay: float = .035  # 0.03
     grab_end_delay: float = 1
-    retract_delay: float = 3.0
     loosen_delay: float = 1.0
     cup_extension_actuator_pwm: int = 240
-    cup_extension_delay: float = 3
+    # partial extension reached while the base is still closing on a cup
+    prestage_extension_pwm: int = 160
     dispense_pwm: int = 100
     dispense_time: float = 4.5
     dispense_end_delay: float = 0.5
@@ -27,53 +28,87 @@ class Grabber:
             pi: pigpio.pi,
             linear_actuator_pwm_pin: int,
             brushed_motor_pwm_pin: int,
-            brushed_motor_direction_pin: int) -> None:
-        """Initialize linear actuator and brushed motor objects"""
-        self.motor: BrushedMotor = BrushedMotor(
-            pi,
-            brushed_motor_direction_pin,
-            brushed_motor_pwm_pin,
-            10000)
-        self.actuator: LinearActuator = LinearActuator(
-            pi,
-            linear_actuator_pwm_pin,
-            1000
-        )
+            brushed_motor_direction_pin: int,
+            actuator_model: Optional[ActuatorModel] = None,
+            motor: Optional[Motor] = None,
+            actuator: Optional[Actuator] = None) -> None:
+        """Initialize linear actuator and brushed motor objects, unless
+        stand-ins are given"""
+        if motor is None:
+            motor = BrushedMotor(
+                pi,
+                brushed_motor_direction_pin,
+                brushed_motor_pwm_pin,
+                10000)
+        if actuator is None:
+            actuator = LinearActuator(
+                pi,
+                linear_actuator_pwm_pin,
+                1000,
+                actuator_model
+            )
+        self.motor: Motor = motor
+        self.actuator: Actuator = actuator
 
-    def grab(self) -> None:
+    def grab_action(self) -> Action:
         """Extend grabbing mechanism and grab beads"""
         self.motor.set_direction_forward()
         self.motor.set_motor_pwm(self.grab_motor_pwm)
         self.actuator.set_extension_pwm(self.grab_actuator_min_pwm)
-        time.sleep(self.grab_initial_delay)
-        for pwm in range(
-                self.grab_actuator_min_pwm,
-                self.grab_actuator_max_pwm):
-            self.actuator.set_extension_pwm(pwm)
-            time.sleep(self.grab_extension_delay)
-        time.sleep(self.grab_end_delay)
+        yield self.grab_initial_delay
+        yield self.actuator.ramp_extension_pwm(
+            self.grab_actuator_min_pwm,
+            self.grab_actuator_max_pwm,
+            self.grab_extension_delay)
+        yield self.grab_end_delay
         self.motor.set_motor_pwm(0)
 
-    def retract(self) -> None:
+    def retract_action(self) -> Action:
         """Retract grabbing mechanism"""
         self.actuator.set_extension_minimum()
-        time.sleep(self.retract_delay)
+        yield self.actuator.remaining_travel()
 
-    def extend_to_cup(self) -> None:
+    def extend_to_action(self, pwm: int) -> Action:
+        """Extend grabbing mechanism to pwm and wait for it to get there"""
+        self.actuator.set_extension_pwm(pwm)
+        yield self.actuator.remaining_travel()
+
+    def extend_to_cup_action(self) -> Action:
         """Extend grabbing mechanism to hover over cup"""
-        self.actuator.set_extension_pwm(self.cup_extension_actuator_pwm)
-        time.sleep(self.cup_extension_delay)
+        yield from self.extend_to_action(self.cup_extension_actuator_pwm)
 
-    def dispense_beads(self) -> None:
+    def prestage_cup_action(self) -> Action:
+        """Extend grabbing mechanism part way toward the cup"""
+        yield from self.extend_to_action(self.prestage_extension_pwm)
+
+    def dispense_beads_action(self) -> Action:
         """Rotate grabbing mechanism to drop beads"""
         self.motor.set_direction_backward()
         self.motor.set_motor_pwm(self.dispense_pwm)
-        time.sleep(self.dispense_time)
+        yield self.dispense_time
         self.motor.set_motor_pwm(0)
         self.motor.set_direction_forward()
-        time.sleep(self.dispense_end_delay)
+        yield self.dispense_end_delay
+
+    def grab(self) -> None:
+        """Extend grabbing mechanism and grab beads"""
+        run_action(self.grab_action())
+
+    def retract(self) -> None:
+        """Retract grabbing mechanism"""
+        run_action(self.retract_action())
+
+    def extend_to_cup(self) -> None:
+        """Extend grabbing mechanism to hover over cup"""
+        run_action(self.extend_to_cup_action())
+
+    def dispense_beads(self) -> None:
+        """Rotate grabbing mechanism to drop beads"""
+        run_action(self.dispense_beads_action())
 
     def stop(self) -> None:
         """Retract actuator and stop coil"""
         self.actuator.set_extension_minimum()
         self.motor.set_motor_pwm(0)
+        self.actuator.close()
+        self.motor.close()
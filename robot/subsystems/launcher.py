@@ -1,7 +1,8 @@
 import pigpio
-import time
+from typing import Optional
 
-from robot.hardware.brushed_motor import BrushedMotor
+from robot.hardware.brushed_motor import BrushedMotor, Motor
+from robot.utils.actions import Action, run_action
 
 
 class Launcher:
@@ -15,25 +16,38 @@ class Launcher:
         pi: pigpio.pi,
         brushed_motor_pwm_pin: int,
         brushed_motor_direction_pin: int,
+        motor: Optional[Motor] = None
     ) -> None:
-        """Initialize brushed motor object for launcher"""
-        self.motor: BrushedMotor = BrushedMotor(
-            pi,
-            brushed_motor_pwm_pin,
-            brushed_motor_direction_pin,
-            self.motor_frequency
-        )
+        """Initialize brushed motor object for launcher, unless a stand-in
+        is given"""
+        if motor is None:
+            motor = BrushedMotor(
+                pi,
+                brushed_motor_pwm_pin,
+                brushed_motor_direction_pin,
+                self.motor_frequency
+            )
+        self.motor: Motor = motor
 
     def run(self) -> None:
         """Start launcher belt spinning"""
         self.motor.set_direction_forward()
         self.motor.set_motor_pwm(255)
 
-    def stop(self) -> None:
+    def spin_up_action(self) -> Action:
+        """Start launcher belt spinning"""
+        self.run()
+        yield None
+
+    def stop_action(self) -> Action:
         """Stop launcher belt spinning"""
-        time.sleep(self.run_end_delay)
+        yield self.run_end_delay
         self.motor.set_motor_pwm(0)
 
+    def stop(self) -> None:
+        """Stop launcher belt spinning"""
+        run_action(self.stop_action())
+
     def emergency_stop(self) -> None:
         """Stop launcher belt spinning without delay"""
         self.motor.set_motor_pwm(0)
@@ -1,6 +1,10 @@
-from typing import Tuple
+import pigpio
+from typing import List, Optional, Tuple
 
-from robot.hardware.stepper_motor import StepperMotor
+from robot.hardware.motion_profile import MotionProfile
+from robot.hardware.stepper_motor import Stepper, StepperMotor
+from robot.utils.actions import Action, run_action
+from robot.utils.persist import load_json, save_json
 
 
 class Lift:
@@ -11,45 +15,138 @@ class Lift:
     clear_steps: int = 700
     lower_steps: int = 2100
 
+    # absolute positions in steps above the bottom of travel
+    home_position: int = 0
+    rise_position: int = rise_steps
+    hook_position: int = rise_position + increment_steps
+    clear_position: int = hook_position + clear_steps
+    run_position: int = clear_position - lower_steps
+
     def __init__(
         self,
         phase_a_pins: Tuple[int, int],
-        phase_b_pins: Tuple[int, int]
+        phase_b_pins: Tuple[int, int],
+        pi: Optional[pigpio.pi] = None,
+        profile: Optional[MotionProfile] = None,
+        position_path: Optional[str] = None,
+        stepper: Optional[Stepper] = None
     ) -> None:
-        """Initialize stepper motor for lift"""
-        self.stepper = StepperMotor(phase_a_pins, phase_b_pins)
+        """Initialize stepper motor for lift, unless a stand-in is given,
+        picking up the position saved at position_path by the last run"""
+        if stepper is None:
+            stepper = StepperMotor(phase_a_pins, phase_b_pins, pi, profile)
+        self.stepper: Stepper = stepper
+        self.position_path = position_path
+        # None while moving or after an interrupted move
+        self.position: Optional[int] = self.home_position
+        if position_path is not None:
+            data = load_json(position_path, {'position': self.home_position})
+            self.position = data.get('position')
+            if self.position is None:
+                print('[!] Lift position was lost, it needs homing')
+        self._sync_phase()
+
+    def _sync_phase(self) -> None:
+        """Line the stepper phase up with the position, the first step
+        above home energizing the first coil"""
+        if self.position is not None:
+            self.stepper.coil = (self.position - 1) % len(self.stepper.coils)
+
+    def _save_position(self) -> None:
+        if self.position_path is not None:
+            save_json(self.position_path, {'position': self.position})
+
+    def plan_path(self, *positions: int) -> List[int]:
+        """Signed step counts visiting positions in order from the current
+        position, merging segments that continue in the same direction"""
+        path: List[int] = []
+        position = self.position
+        if position is None:
+            raise RuntimeError("[!] Lift position unknown, reset it first")
+        for target in positions:
+            steps = target - position
+            position = target
+            if steps == 0:
+                continue
+            if path and (path[-1] > 0) == (steps > 0):
+                path[-1] += steps
+            else:
+                path.append(steps)
+        return path
+
+    def move_to_action(self, *positions: int) -> Action:
+        """Move through positions in one continuous motion"""
+        path = self.plan_path(*positions)
+        if not path:
+            return
+        self.position = None
+        self._save_position()
+        yield self.stepper.start_path(path)
+        self.position = positions[-1]
+        self._save_position()
+
+    def home_action(self) -> Action:
+        """Return to the bottom of travel, driving into the end stop over
+        the full travel when the position is unknown"""
+        if self.position is not None:
+            yield from self.move_to_action(self.home_position)
+            return
+        self.stepper.reset_phase()
+        yield self.stepper.start_backward(self.clear_position)
+        self.position = self.home_position
+        self._sync_phase()
+        self._save_position()
+
+    def initial_rise_action(self) -> Action:
+        """Lift scissor lift to default height"""
+        yield from self.move_to_action(self.rise_position)
+
+    def second_rise_action(self) -> Action:
+        """Lift scissor lift from run height to default height"""
+        yield from self.move_to_action(self.rise_position)
+
+    def increment_action(self) -> Action:
+        """Lift scissor lift an additional small amount"""
+        yield from self.move_to_action(self.hook_position)
+
+    def clear_action(self) -> Action:
+        """Lift scissor lift to clear beads from hook"""
+        yield from self.move_to_action(self.clear_position)
+
+    def lower_action(self) -> Action:
+        """Lower scissor lift to default height"""
+        yield from self.move_to_action(self.run_position)
+
+    def move_to(self, *positions: int) -> None:
+        """Move through positions in one continuous motion"""
+        run_action(self.move_to_action(*positions))
 
     def initial_rise(self) -> None:
         """Lift scissor lift to default height"""
-        self.stepper.step_forward(self.rise_steps)
+        run_action(self.initial_rise_action())
 
     def second_rise(self) -> None:
         """Lift scissor lift from run height to default height"""
-        self.stepper.step_forward(
-            self.lower_steps -
-            self.increment_steps -
-            self.clear_steps)
+        run_action(self.second_rise_action())
 
     def incremement(self) -> None:
         """Lift scissor lift an additional small amount"""
-        self.stepper.step_forward(self.increment_steps)
+        run_action(self.increment_action())
 
     def clear(self) -> None:
         """Lift scissor lift to clear beads from hook"""
-        self.stepper.step_forward(self.clear_steps)
+        run_action(self.clear_action())
 
     def lower(self) -> None:
         """Lower scissor lift to default height"""
-        self.stepper.step_backward(self.lower_steps)
+        run_action(self.lower_action())
 
     def reset(self) -> None:
         """Lower scissor lift back to starting height"""
-        self.stepper.step_backward(
-            self.rise_steps +
-            self.clear_steps +
-            self.increment_steps -
-            self.lower_steps)
+        run_action(self.home_action())
 
     def stop(self) -> None:
-        """Wrapper for resetting stepper motor phase"""
-        self.stepper.reset_phase()
+        """Stop any move and release the coils, keeping the stepper phase
+        in line with the position unless a move was cut short"""
+        self.stepper.stop()
+        self._sync_phase()
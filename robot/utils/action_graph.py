@@ -0,0 +1,80 @@
+from typing import Callable, Dict, FrozenSet, List, NamedTuple, Sequence, Set, Tuple
+
+from robot.utils import clock
+from robot.utils.actions import Action, ActionRunner
+
+
+class ActionNode(NamedTuple):
+    """One step of a sequence, started once every node it comes after has
+    finished and none of its resources are held by a running node"""
+    name: str
+    action: Callable[[], Action]
+    after: Tuple[str, ...] = ()
+    resources: FrozenSet[str] = frozenset()
+
+
+class ActionGraph:
+    """Actions with dependencies and resource locks, run as one action so
+    independent branches overlap and it finishes on its critical path"""
+
+    def __init__(self, nodes: Sequence[ActionNode]) -> None:
+        """Check nodes form a graph that can run to completion"""
+        names = [node.name for node in nodes]
+        if len(set(names)) != len(names):
+            raise ValueError("[!] Action graph node names must be unique")
+        for node in nodes:
+            for name in node.after:
+                if name not in names:
+                    raise ValueError(
+                        "[!] Action graph node {} comes after unknown node {}"
+                        .format(node.name, name))
+        ordered: Set[str] = set()
+        remaining = list(nodes)
+        while remaining:
+            ready = [node for node in remaining if set(node.after) <= ordered]
+            if not ready:
+                raise ValueError("[!] Action graph has a dependency cycle")
+            for node in ready:
+                ordered.add(node.name)
+                remaining.remove(node)
+        self.nodes: Tuple[ActionNode, ...] = tuple(nodes)
+
+    def run(
+            self,
+            now: Callable[[], float] = clock.monotonic,
+            held: Callable[[], FrozenSet[str]] = frozenset) -> Action:
+        """Action running every node, yielding once per step. held reports
+        resources locked outside the graph, which nodes also wait for."""
+        pending: List[ActionNode] = list(self.nodes)
+        running: Dict[str, Tuple[ActionNode, ActionRunner]] = {}
+        finished: Set[str] = set()
+        locked: Set[str] = set()
+        try:
+            while pending or running:
+                current = now()
+                progressed = False
+                outside = held()
+                # nodes start in declared order, so earlier ones win a resource
+                for node in list(pending):
+                    if not set(node.after) <= finished:
+                        continue
+                    if node.resources & locked or node.resources & outside:
+                        continue
+                    pending.remove(node)
+                    locked |= node.resources
+                    running[node.name] = (
+                        node, ActionRunner(node.action(), current))
+                for name, (node, runner) in list(running.items()):
+                    if runner.step(current):
+                        del running[name]
+                        finished.add(name)
+                        locked -= node.resources
+                        progressed = True
+                # dependents of a finished node start in the same step
+                if not progressed:
+                    yield None
+        finally:
+            # a failed node or a cancelled graph stops every other branch
+            for node, runner in running.values():
+                if not runner.done:
+                    runner.cancel()
@@ -0,0 +1,145 @@
+from typing import Callable, Generator, Optional, Protocol, Union
+
+from robot.utils import clock
+
+
+class Waitable(Protocol):
+    """Anything an action can wait on until it reports done"""
+
+    @property
+    def done(self) -> bool:
+        ...
+
+
+# An action is a generator describing a mechanism sequence. It yields a
+# number of seconds to sleep, a Waitable to wait on, or None to resume on
+# the next step, so it can be advanced a little at a time by the caller.
+Action = Generator[Union[float, Waitable, None], None, None]
+
+
+class ThreadTask:
+    """Runs a blocking call on a daemon thread"""
+
+    def __init__(self, target: Callable[[], None]) -> None:
+        """Start target on its own thread"""
+        self.error: Optional[BaseException] = None
+        # set by the thread itself, so done flips at the same point of a
+        # simulated run every time
+        self._done = False
+        self._thread = clock.start_thread(
+            lambda: self._run(target), 'thread-task')
+
+    def _run(self, target: Callable[[], None]) -> None:
+        try:
+            target()
+        except BaseException as e:
+            self.error = e
+        finally:
+            self._done = True
+
+    @property
+    def done(self) -> bool:
+        return self._done
+
+
+class ActionRunner:
+    """Advances a single action, keeping track of what it waits on"""
+
+    def __init__(self, action: Action, now: float) -> None:
+        """Initialize runner for an action starting at time now"""
+        self.action = action
+        self.wake_time = now
+        self.waiting: Optional[Waitable] = None
+        self.done = False
+
+    def step(self, now: float) -> bool:
+        """Run the action until it has to wait, returning true once done"""
+        while not self.done:
+            if self.waiting is not None:
+                if not self.waiting.done:
+                    return False
+                error = getattr(self.waiting, 'error', None)
+                self.waiting = None
+                self.wake_time = now
+                if error is not None:
+                    raise error
+            if now < self.wake_time:
+                return False
+            try:
+                request = next(self.action)
+            except StopIteration:
+                self.done = True
+                break
+            if request is None:
+                self.wake_time = now
+                return False
+            if isinstance(request, (int, float)):
+                # sleeps chain off the last wake time, so a run of short
+                # sleeps keeps its total duration whatever the step rate
+                self.wake_time += request
+            else:
+                self.waiting = request
+        return True
+
+    def cancel(self) -> None:
+        """Abandon the action, stopping whatever it waits on if that can
+        be stopped"""
+        cancel = getattr(self.waiting, 'cancel', None)
+        if cancel is not None:
+            cancel()
+        self.waiting = None
+        self.action.close()
+        self.done = True
+
+
+class ActionExecutor:
+    """Runs one action at a time, advanced by calling step each tick"""
+
+    def __init__(self, now: Callable[[], float] = clock.monotonic) -> None:
+        """Initialize idle executor using the given time source"""
+        self.now = now
+        self.runner: Optional[ActionRunner] = None
+
+    @property
+    def busy(self) -> bool:
+        return self.runner is not None
+
+    def start(self, action: Action) -> None:
+        """Begin an action and run it up to its first wait"""
+        if self.runner is not None:
+            raise RuntimeError("[!] Executor is already running an action")
+        self.runner = ActionRunner(action, self.now())
+        self.step()
+
+    def step(self) -> None:
+        """Advance the current action as far as it can go right now"""
+        if self.runner is None:
+            return
+        try:
+            done = self.runner.step(self.now())
+        except BaseException:
+            self.runner = None
+            raise
+        if done:
+            self.runner = None
+
+    def cancel(self) -> None:
+        """Abandon the current action"""
+        if self.runner is not None:
+            self.runner.cancel()
+            self.runner = None
+
+
+def run_action(action: Action, poll_interval: float = 0.001) -> None:
+    """Run an action to completion, blocking the caller"""
+    for request in action:
+        if request is None:
+            continue
+        if isinstance(request, (int, float)):
+            clock.sleep(request)
+            continue
+        while not request.done:
+            clock.sleep(poll_interval)
+        error = getattr(request, 'error', None)
+        if error is not None:
+            raise error
@@ -0,0 +1,197 @@
+import itertools
+import math
+import threading
+import time
+from abc import ABC, abstractmethod
+from typing import Callable, Dict, List, Optional
+
+
+class Clock(ABC):
+    """Source of time for everything that sleeps, waits or timestamps"""
+
+    @abstractmethod
+    def monotonic(self) -> float:
+        """Seconds from an arbitrary start, never going backwards"""
+
+    @abstractmethod
+    def sleep(self, seconds: float) -> None:
+        """Block for seconds"""
+
+    @abstractmethod
+    def wait(self, event: threading.Event, timeout: Optional[float] = None) -> bool:
+        """Block until event is set or timeout passes, returning whether
+        it was set"""
+
+    @abstractmethod
+    def start_thread(self, target: Callable[[], None], name: str) -> threading.Thread:
+        """Run target on a new daemon thread that keeps time by this clock"""
+
+    @abstractmethod
+    def join(self, thread: threading.Thread) -> None:
+        """Wait for a thread started by start_thread to finish"""
+
+
+class RealClock(Clock):
+    """Wall clock time, used on the robot"""
+
+    def monotonic(self) -> float:
+        return time.monotonic()
+
+    def sleep(self, seconds: float) -> None:
+        time.sleep(seconds)
+
+    def wait(self, event: threading.Event, timeout: Optional[float] = None) -> bool:
+        return event.wait(timeout)
+
+    def start_thread(self, target: Callable[[], None], name: str) -> threading.Thread:
+        thread = threading.Thread(target=target, name=name, daemon=True)
+        thread.start()
+        return thread
+
+    def join(self, thread: threading.Thread) -> None:
+        thread.join()
+
+
+class _Participant:
+    """A thread taking turns on a VirtualClock"""
+
+    def __init__(self) -> None:
+        self.wake_time = math.inf
+        self.sequence = 0
+        self.event: Optional[threading.Event] = None
+        self.finished = threading.Event()
+
+
+class VirtualClock(Clock):
+    """Discrete event time for simulation. The threads taking part run one
+    at a time: each keeps running until it sleeps or waits, then the one
+    due soonest runs with time moved on to when it was due, so a run takes
+    as long as its computation and always interleaves the same way. The
+    thread creating the clock takes part, others through start_thread."""
+
+    def __init__(self, start: float = 0.0) -> None:
+        """Initialize clock at start seconds, run by the calling thread"""
+        self.now = start
+        self._condition = threading.Condition()
+        self._sequence = itertools.count()
+        main = _Participant()
+        self._participants: Dict[threading.Thread, _Participant] = {
+            threading.current_thread(): main}
+        self._running: Optional[_Participant] = main
+        # participants sleeping or waiting for their turn
+        self._blocked: List[_Participant] = []
+
+    def monotonic(self) -> float:
+        return self.now
+
+    def sleep(self, seconds: float) -> None:
+        self._block(self.now + max(0.0, seconds), None)
+
+    def wait(self, event: threading.Event, timeout: Optional[float] = None) -> bool:
+        if event.is_set():
+            return True
+        self._block(
+            math.inf if timeout is None else self.now + max(0.0, timeout), event)
+        return event.is_set()
+
+    def start_thread(self, target: Callable[[], None], name: str) -> threading.Thread:
+        participant = _Participant()
+
+        def run() -> None:
+            with self._condition:
+                while self._running is not participant:
+                    self._condition.wait()
+            try:
+                target()
+            finally:
+                with self._condition:
+                    participant.finished.set()
+                    del self._participants[thread]
+                    self._switch()
+
+        thread = threading.Thread(target=run, name=name, daemon=True)
+        with self._condition:
+            participant.wake_time = self.now
+            participant.sequence = next(self._sequence)
+            self._participants[thread] = participant
+            self._blocked.append(participant)
+        thread.start()
+        return thread
+
+    def join(self, thread: threading.Thread) -> None:
+        with self._condition:
+            participant = self._participants.get(thread)
+        if participant is not None:
+            self.wait(participant.finished)
+        thread.join()
+
+    def _block(self, wake_time: float, event: Optional[threading.Event]) -> None:
+        """Give up the turn until wake_time or until event is set"""
+        with self._condition:
+            participant = self._participants.get(threading.current_thread())
+            if participant is None or participant is not self._running:
+                raise RuntimeError(
+                    "[!] Only the running clock participant can sleep")
+            participant.wake_time = wake_time
+            participant.event = event
+            participant.sequence = next(self._sequence)
+            self._blocked.append(participant)
+            self._switch()
+            while self._running is not participant:
+                self._condition.wait()
+            participant.event = None
+
+    def _due(self, participant: _Participant) -> float:
+        if participant.event is not None and participant.event.is_set():
+            return self.now
+        return participant.wake_time
+
+    def _switch(self) -> None:
+        """Hand the turn to the participant due soonest, in the order they
+        blocked when due together"""
+        if not self._blocked:
+            self._running = None
+            return
+        participant = min(
+            self._blocked,
+            key=lambda participant: (self._due(participant), participant.sequence))
+        due = self._due(participant)
+        if due == math.inf:
+            raise RuntimeError("[!] Every clock participant is waiting forever")
+        self._blocked.remove(participant)
+        self.now = max(self.now, due)
+        self._running = participant
+        self._condition.notify_all()
+
+
+_clock: Clock = RealClock()
+
+
+def get_clock() -> Clock:
+    return _clock
+
+
+def set_clock(clock: Clock) -> None:
+    """Switch every module over to clock, before anything starts using it"""
+    global _clock
+    _clock = clock
+
+
+def monotonic() -> float:
+    return _clock.monotonic()
+
+
+def sleep(seconds: float) -> None:
+    _clock.sleep(seconds)
+
+
+def wait(event: threading.Event, timeout: Optional[float] = None) -> bool:
+    return _clock.wait(event, timeout)
+
+
+def start_thread(target: Callable[[], None], name: str) -> threading.Thread:
+    return _clock.start_thread(target, name)
+
+
+def join(thread: threading.Thread) -> None:
+    _clock.join(thread)
@@ -0,0 +1,198 @@
+from abc import ABC, abstractmethod
+from bisect import bisect_left, insort
+from typing import Collection, List, Optional
+
+
+class RingBuffer:
+    """Fixed-size buffer of the most recent values with a running sum"""
+
+    def __init__(self, size: int) -> None:
+        """Initialize empty buffer holding up to size values"""
+        if size < 1:
+            raise ValueError("[!] Ring buffer size must be at least 1")
+        self.size = size
+        self.values: List[float] = [0.0] * size
+        self.count = 0
+        self.index = 0
+        self.total = 0.0
+
+    def append(self, value: float) -> Optional[float]:
+        """Add value, returning the oldest value if it was pushed out"""
+        evicted = None
+        if self.count == self.size:
+            evicted = self.values[self.index]
+            self.total -= evicted
+        else:
+            self.count += 1
+        self.values[self.index] = value
+        self.total += value
+        self.index += 1
+        if self.index == self.size:
+            self.index = 0
+            # resum once per lap so floating point error cannot build up
+            self.total = sum(self.values[:self.count])
+        return evicted
+
+    def clear(self) -> None:
+        """Remove all values"""
+        self.count = 0
+        self.index = 0
+        self.total = 0.0
+
+    def __len__(self) -> int:
+        return self.count
+
+
+class Filter(ABC):
+    """Base class for filters smoothing a stream of distance samples"""
+
+    @abstractmethod
+    def update(self, value: float, status: int = 0) -> None:
+        """Add a sample along with its sensor range status"""
+
+    @property
+    @abstractmethod
+    def value(self) -> float:
+        """Filtered value, 0 before any sample is accepted"""
+
+    @abstractmethod
+    def reset(self) -> None:
+        """Forget all samples"""
+
+
+class MovingAverageFilter(Filter):
+    """Mean of the last size samples"""
+
+    def __init__(self, size: int = 5) -> None:
+        self.buffer = RingBuffer(size)
+
+    def update(self, value: float, status: int = 0) -> None:
+        self.buffer.append(value)
+
+    @property
+    def value(self) -> float:
+        if self.buffer.count == 0:
+            return 0
+        return self.buffer.total / self.buffer.count
+
+    def reset(self) -> None:
+        self.buffer.clear()
+
+
+class MedianFilter(Filter):
+    """Median of the last size samples"""
+
+    def __init__(self, size: int = 5) -> None:
+        self.buffer = RingBuffer(size)
+        self.ordered: List[float] = []
+
+    def update(self, value: float, status: int = 0) -> None:
+        evicted = self.buffer.append(value)
+        if evicted is not None:
+            del self.ordered[bisect_left(self.ordered, evicted)]
+        insort(self.ordered, value)
+
+    @property
+    def value(self) -> float:
+        count = len(self.ordered)
+        if count == 0:
+            return 0
+        middle = count // 2
+        if count % 2 == 1:
+            return self.ordered[middle]
+        return (self.ordered[middle - 1] + self.ordered[middle]) / 2
+
+    def reset(self) -> None:
+        self.buffer.clear()
+        self.ordered = []
+
+
+class EMAFilter(Filter):
+    """Exponential moving average, larger alpha follows changes faster"""
+
+    def __init__(self, alpha: float = 0.5) -> None:
+        if alpha <= 0 or alpha > 1:
+            raise ValueError("[!] EMA alpha must be in (0, 1]")
+        self.alpha = alpha
+        self._value: Optional[float] = None
+
+    def update(self, value: float, status: int = 0) -> None:
+        if self._value is None:
+            self._value = value
+        else:
+            self._value += self.alpha * (value - self._value)
+
+    @property
+    def value(self) -> float:
+        if self._value is None:
+            return 0
+        return self._value
+
+    def reset(self) -> None:
+        self._value = None
+
+
+class RejectionFilter(Filter):
+    """Drops invalid or outlying samples before they reach another filter"""
+
+    def __init__(
+            self,
+            inner: Filter,
+            min_distance: float = 0,
+            max_distance: Optional[float] = None,
+            valid_statuses: Optional[Collection[int]] = None,
+            max_step: Optional[float] = None,
+            max_step_rejections: int = 3) -> None:
+        """Reject samples at or below min_distance, above max_distance,
+        with a range status outside valid_statuses, or jumping more than
+        max_step from the current value. A jump persisting for more than
+        max_step_rejections samples is accepted as a real change, and later
+        samples are measured from it."""
+        self.inner = inner
+        self.min_distance = min_distance
+        self.max_distance = max_distance
+        self.valid_statuses = valid_statuses
+        self.max_step = max_step
+        self.max_step_rejections = max_step_rejections
+        self.rejected = 0
+        self._step_rejections = 0
+        # last accepted sample, which steps are measured from
+        self._reference: Optional[float] = None
+
+    def update(self, value: float, status: int = 0) -> None:
+        if not self._accept(value, status):
+            self.rejected += 1
+            return
+        self.inner.update(value, status)
+        self._reference = value
+
+    def _accept(self, value: float, status: int) -> bool:
+        """Check sample against status, range and step limits"""
+        if self.valid_statuses is not None and status not in self.valid_statuses:
+            return False
+        if value <= self.min_distance:
+            return False
+        if self.max_distance is not None and value > self.max_distance:
+            return False
+        if self.max_step is not None and self._reference is not None:
+            if abs(value - self._reference) > self.max_step:
+                self._step_rejections += 1
+                if self._step_rejections <= self.max_step_rejections:
+                    return False
+        self._step_rejections = 0
+        return True
+
+    @property
+    def value(self) -> float:
+        return self.inner.value
+
+    def reset(self) -> None:
+        self.inner.reset()
+        self.rejected = 0
+        self._step_rejections = 0
+        self._reference = None
+
+
+def default_tof_filter() -> Filter:
+    """Five sample mean ignoring zero readings"""
+    return RejectionFilter(MovingAverageFilter(5))
@@ -1,20 +1,41 @@
 import board
 import pigpio
 import RPi.GPIO as GPIO
-import time
-from typing import TypedDict
+from typing import Callable, Dict, List, Mapping, Optional, Tuple, TypedDict
 
+from robot.drivers.vl53l1x import VL53L1X
 from robot.hardware.brushed_motor import BrushedMotor
 from robot.hardware.line_follow_array import LineFollowArray
+from robot.hardware.linear_actuator import ActuatorModel, load_actuator_model
+from robot.hardware.motion_profile import MotionProfile, load_motion_profile
 from robot.hardware.tof import TOF
 
 from robot.subsystems.grabber import Grabber
 from robot.subsystems.launcher import Launcher
 from robot.subsystems.lift import Lift
+from robot.utils import clock
+from robot.utils.filters import Filter, default_tof_filter
 
+tof_names = ('left', 'middle', 'right', 'top', 'bottom')
 tof_pins = (10, 9, 11, 19, 26)
+tof_addresses = (0x30, 0x31, 0x32, 0x33, 0x34)
+tof_xshut_delay = 0.01
+tof_init_timeout = 1.0
+# Pi GPIOs wired to each sensor's GPIO1 data ready output, in the same
+# order as tof_pins, None to poll the sensors
+tof_interrupt_pins: Optional[Tuple[int, int, int, int, int]] = None
+# filter factory for each sensor, called again whenever sensors are reset
+tof_filters: Dict[str, Callable[[], Filter]] = {
+    'left': default_tof_filter,
+    'middle': default_tof_filter,
+    'right': default_tof_filter,
+    'top': default_tof_filter,
+    'bottom': default_tof_filter,
+}
 
 line_pins = [0, 1, 2, 3, 4, 5, 6, 7]
+# Pi GPIO wired to the SX1509 NINT output, None to poll the line array
+line_interrupt_pin: Optional[int] = None
 
 left_pwm_pin = 16
 right_pwm_pin = 13
@@ -24,12 +45,22 @@ right_dir_pin = 21
 coil_pwm_pin = 15
 coil_dir_pin = 14
 linear_actuator_pwm_pin = 12
+# actuator travel time model, written by robot.calibrate_actuator
+actuator_model_path = '/home/pi/Desktop/senior-project/calibration/actuator_model.json'
+actuator_model = ActuatorModel(dead_time=0.0, speed=80.0)
 
 launcher_pwm_pin = 22
 launcher_dir_pin = 23
 
 phase_a_pins = (17, 18)
 phase_b_pins = (27, 22)
+# lift stepper rates, cruise_rate written by robot.calibrate_lift
+lift_profile_path = '/home/pi/Desktop/senior-project/calibration/lift_profile.json'
+lift_profile = MotionProfile(start_rate=200, cruise_rate=200, acceleration=2000)
+# binary telemetry of every run, decode with python -m robot.utils.telemetry
+telemetry_dir = '/home/pi/Desktop/senior-project/logs'
+# absolute lift position, kept between runs
+lift_position_path = '/home/pi/Desktop/senior-project/state/lift_position.json'
 
 
 class TOFDevices(TypedDict):
@@ -40,33 +71,111 @@ class TOFDevices(TypedDict):
     bottom: TOF
 
 
-def init_tof(i2c: board.I2C) -> TOFDevices:
-    for pin in tof_pins:
-        GPIO.setup(pin, GPIO.OUT)
-        GPIO.output(pin, GPIO.LOW)
-    time.sleep(0.03)
+class TOFBringUpTimes(TypedDict):
+    power: float
+    address: float
+    sensor_init: float
+    configure: float
+    total: float
+
+
+def bring_up_tof(
+        i2c: board.I2C,
+        pi: Optional[pigpio.pi] = None,
+        filters: Optional[Mapping[str, Callable[[], Filter]]] = None
+) -> Tuple[TOFDevices, TOFBringUpTimes]:
+    """Bring up all sensors, returning them with each phase's duration in ms"""
+    factories = dict(tof_filters)
+    if filters is not None:
+        factories.update(filters)
+    start = clock.monotonic()
+
+    # sensors still answering at their address from an earlier run are kept
     for pin in tof_pins:
+        GPIO.setup(pin, GPIO.OUT, initial=GPIO.HIGH)
+    addressed = [VL53L1X.probe(i2c, address) for address in tof_addresses]
+    for pin, ready in zip(tof_pins, addressed):
+        if not ready:
+            GPIO.output(pin, GPIO.LOW)
+    clock.sleep(tof_xshut_delay)
+    power_done = clock.monotonic()
+
+    # the rest come up one at a time at the default address to be moved
+    devices: List[VL53L1X] = []
+    for pin, address, ready in zip(tof_pins, tof_addresses, addressed):
+        if ready:
+            device = VL53L1X(
+                i2c, address, current_address=address, initialize=False)
+            # still ranging from the earlier run, which begin_init would
+            # reload the configuration underneath
+            device.stop_ranging()
+            device.clear_interrupt()
+            devices.append(device)
+            continue
         GPIO.output(pin, GPIO.HIGH)
-    time.sleep(0.03)
-    for pin in tof_pins:
-        GPIO.output(pin, GPIO.LOW)
-    GPIO.output(tof_pins[0], GPIO.HIGH)
-    left = TOF(i2c, 0x30)
-    GPIO.output(tof_pins[1], GPIO.HIGH)
-    middle = TOF(i2c, 0x31)
-    GPIO.output(tof_pins[2], GPIO.HIGH)
-    right = TOF(i2c, 0x32)
-    GPIO.output(tof_pins[3], GPIO.HIGH)
-    top = TOF(i2c, 0x33)
-    GPIO.output(tof_pins[4], GPIO.HIGH)
-    bottom = TOF(i2c, 0x34)
-    return {
+        clock.sleep(tof_xshut_delay)
+        devices.append(VL53L1X(i2c, address, initialize=False))
+    address_done = clock.monotonic()
+
+    # every sensor has its own address now, so first rangings overlap
+    for device in devices:
+        device.begin_init()
+    pending = list(devices)
+    deadline = clock.monotonic() + tof_init_timeout
+    while pending:
+        for device in [device for device in pending if device.data_ready]:
+            device.finish_init()
+            pending.remove(device)
+        if pending:
+            if clock.monotonic() > deadline:
+                raise RuntimeError("[!] ToF sensor init timed out")
+            clock.sleep(0.005)
+    init_done = clock.monotonic()
+
+    tofs = []
+    for name, pin, address, device in zip(
+            tof_names, tof_pins, tof_addresses, devices):
+        device.configure(TOF.distance_mode, TOF.timing_budget)
+        device.start_ranging()
+        tofs.append(TOF(i2c, address, factories[name](), pin, device))
+    if pi is not None and tof_interrupt_pins is not None:
+        for tof, pin in zip(tofs, tof_interrupt_pins):
+            tof.enable_interrupt(pi, pin)
+    configure_done = clock.monotonic()
+
+    left, middle, right, top, bottom = tofs
+    devices_by_name: TOFDevices = {
         'left': left,
         'middle': middle,
         'right': right,
         'top': top,
         'bottom': bottom
     }
+    times: TOFBringUpTimes = {
+        'power': (power_done - start) * 1000,
+        'address': (address_done - power_done) * 1000,
+        'sensor_init': (init_done - address_done) * 1000,
+        'configure': (configure_done - init_done) * 1000,
+        'total': (configure_done - start) * 1000,
+    }
+    return devices_by_name, times
+
+
+def init_tof(
+        i2c: board.I2C,
+        pi: Optional[pigpio.pi] = None,
+        filters: Optional[Mapping[str, Callable[[], Filter]]] = None
+) -> TOFDevices:
+    devices, times = bring_up_tof(i2c, pi, filters)
+    print(
+        '[*] ToF bring-up {:.1f} ms (power {:.1f}, address {:.1f}, '
+        'init {:.1f}, configure {:.1f})'.format(
+            times['total'],
+            times['power'],
+            times['address'],
+            times['sensor_init'],
+            times['configure']))
+    return devices
 
 
 class Subsystems(TypedDict):
@@ -82,9 +191,25 @@ def init_subsystems(pi: pigpio.pi, i2c: board.I2C) -> Subsystems:
     left_motor = BrushedMotor(pi, left_dir_pin, left_pwm_pin, 10000)
     right_motor = BrushedMotor(pi, right_dir_pin, right_pwm_pin, 10000)
     line_follower = LineFollowArray(i2c, line_pins)
-    grabber = Grabber(pi, linear_actuator_pwm_pin, coil_pwm_pin, coil_dir_pin)
+    if line_interrupt_pin is not None:
+        line_follower.enable_interrupts(pi, line_interrupt_pin)
+    grabber = Grabber(
+        pi,
+        linear_actuator_pwm_pin,
+        coil_pwm_pin,
+        coil_dir_pin,
+        load_actuator_model(actuator_model_path, actuator_model))
     launcher = Launcher(pi, launcher_pwm_pin, launcher_dir_pin)
-    lift = Lift(phase_a_pins, phase_b_pins)
+    lift = Lift(
+        phase_a_pins,
+        phase_b_pins,
+        pi,
+        load_motion_profile(lift_profile_path, lift_profile),
+        lift_position_path)
+    if lift.position is None:
+        # every move plans from the position, so find it before the run
+        print('[*] Homing lift')
+        lift.reset()
     return {
         'left_motor': left_motor,
         'right_motor': right_motor,
@@ -102,3 +227,4 @@ def stop_subsystems(subsystems: Subsystems) -> None:
     subsystems['grabber'].stop()
     subsystems['launcher'].emergency_stop()
     subsystems['lift'].stop()
+    subsystems['line_follower'].disable_interrupts()
@@ -0,0 +1,109 @@
+from typing import Dict, Optional, TypedDict
+
+from robot.utils import clock
+
+
+class LoopStats(TypedDict):
+    ticks: int
+    overruns: int
+    skipped_ticks: int
+    mean_period_ms: float
+    max_jitter_ms: float
+    period_histogram: Dict[float, int]
+    jitter_histogram: Dict[float, int]
+
+
+class LoopScheduler:
+    """Class for running a control loop at a fixed rate on absolute deadlines"""
+
+    period_bin_ms: float = 1.0
+    jitter_bin_ms: float = 0.5
+
+    def __init__(self, rate: float = 60, skip_missed: bool = False) -> None:
+        """Initialize scheduler for the given loop rate in Hz"""
+        if rate <= 0:
+            raise ValueError("[!] Loop rate must be positive")
+        self.rate = rate
+        self.period = 1 / rate
+        self.skip_missed = skip_missed
+        self.ticks = 0
+        self.overruns = 0
+        self.skipped_ticks = 0
+        self.max_jitter = 0.0
+        self.period_histogram: Dict[float, int] = {}
+        self.jitter_histogram: Dict[float, int] = {}
+        self._deadline: Optional[float] = None
+        self._last_tick: Optional[float] = None
+        self._first_tick: Optional[float] = None
+
+    def start(self) -> None:
+        """Anchor the tick deadlines to the current time"""
+        now = clock.monotonic()
+        self._deadline = now + self.period
+        self._last_tick = now
+        self._first_tick = now
+
+    def wait(self) -> None:
+        """Sleep until the next tick deadline, counting and handling overruns"""
+        if self._deadline is None:
+            self.start()
+        deadline = self._deadline
+        assert deadline is not None
+        now = clock.monotonic()
+        if now > deadline:
+            self.overruns += 1
+            if self.skip_missed:
+                # realign to the next deadline still in the future
+                missed = int((now - deadline) / self.period) + 1
+                self.skipped_ticks += missed
+                deadline += missed * self.period
+        if now < deadline:
+            clock.sleep(deadline - now)
+        tick = clock.monotonic()
+        self._record(tick, tick - deadline)
+        self._deadline = deadline + self.period
+
+    def _record(self, tick: float, jitter: float) -> None:
+        """Add tick period and lateness to the histograms"""
+        self.ticks += 1
+        last_tick = self._last_tick if self._last_tick is not None else tick
+        period_ms = (tick - last_tick) * 1000
+        self._last_tick = tick
+        period_bin = int(period_ms / self.period_bin_ms) * self.period_bin_ms
+        self.period_histogram[period_bin] = self.period_histogram.get(
+            period_bin, 0) + 1
+        jitter_ms = max(jitter, 0) * 1000
+        jitter_bin = int(jitter_ms / self.jitter_bin_ms) * self.jitter_bin_ms
+        self.jitter_histogram[jitter_bin] = self.jitter_histogram.get(
+            jitter_bin, 0) + 1
+        self.max_jitter = max(self.max_jitter, jitter_ms)
+
+    def stats(self) -> LoopStats:
+        """Get loop timing statistics collected so far"""
+        mean_period = 0.0
+        if (self.ticks > 0 and self._last_tick is not None and
+                self._first_tick is not None):
+            mean_period = (self._last_tick - self._first_tick) / self.ticks
+        return {
+            'ticks': self.ticks,
+            'overruns': self.overruns,
+            'skipped_ticks': self.skipped_ticks,
+            'mean_period_ms': mean_period * 1000,
+            'max_jitter_ms': self.max_jitter,
+            'period_histogram': dict(sorted(self.period_histogram.items())),
+            'jitter_histogram': dict(sorted(self.jitter_histogram.items())),
+        }
+
+    def summary(self) -> str:
+        """Format loop timing statistics for printing"""
+        stats = self.stats()
+        lines = [
+            '=== Loop Timing ({:.0f} Hz target) ==='.format(self.rate),
+            'ticks: {}, overruns: {}, skipped: {}'.format(
+                stats['ticks'], stats['overruns'], stats['skipped_ticks']),
+            'mean period: {:.2f} ms, max jitter: {:.2f} ms'.format(
+                stats['mean_period_ms'], stats['max_jitter_ms']),
+            'period histogram (ms): {}'.format(stats['period_histogram']),
+            'jitter histogram (ms): {}'.format(stats['jitter_histogram']),
+        ]
+        return '\n'.join(lines)
@@ -0,0 +1,225 @@
+import argparse
+import os
+import struct
+import sys
+import threading
+import time
+from typing import BinaryIO, Iterator, NamedTuple, Optional
+
+from robot.states.state_types import BaseState, RobotState
+from robot.utils import clock
+
+MAGIC = b'RBTL'
+VERSION = 1
+HEADER = struct.Struct('<4sHH')
+
+# flag bits packed into TelemetryRecord.flags
+MOVE_BASE = 0x01
+PAUSEABLE = 0x02
+FINISH = 0x04
+
+
+class TelemetryRecord(NamedTuple):
+    """One control loop tick, in the order it is packed"""
+    tick: int
+    timestamp: float
+    left_tof: float
+    middle_tof: float
+    right_tof: float
+    top_tof: float
+    bottom_tof: float
+    left_line: int
+    right_line: int
+    base_state: int
+    robot_state: int
+    left_pwm: int
+    right_pwm: int
+    left_dir: int
+    right_dir: int
+    cup_net_count: int
+    # bit per sensor in TOFArray.sensor_names order
+    stale: int
+    flags: int
+
+
+RECORD = struct.Struct('<Id5f2h9B')
+
+
+class Transition(NamedTuple):
+    """A state machine changing state on a tick"""
+    tick: int
+    timestamp: float
+    machine: str
+    previous: str
+    state: str
+
+
+class TelemetryRecorder:
+    """Packs records into a preallocated ring buffer, written out to a file
+    in large blocks by a background thread"""
+
+    def __init__(
+            self,
+            path: str,
+            capacity: int = 4096,
+            block_records: int = 512,
+            flush_interval: float = 0.5) -> None:
+        """Initialize recorder holding up to capacity unwritten records"""
+        self.path = path
+        self.capacity = capacity
+        self.block_records = block_records
+        self.flush_interval = flush_interval
+        self.buffer = bytearray(capacity * RECORD.size)
+        # records packed and written so far, only the control loop moves
+        # head and only the writer thread moves tail
+        self.head = 0
+        self.tail = 0
+        self.dropped = 0
+        self._file: Optional[BinaryIO] = None
+        self._wake = threading.Event()
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        """Open the file and start the writer thread"""
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self._file = open(self.path, 'wb')
+        self._file.write(HEADER.pack(MAGIC, VERSION, RECORD.size))
+        self._stop_event.clear()
+        self._thread = clock.start_thread(self._run, 'telemetry-writer')
+
+    def record(self, record: TelemetryRecord) -> None:
+        """Pack a record without blocking, dropping it if the buffer is full"""
+        if self.head - self.tail >= self.capacity:
+            self.dropped += 1
+            return
+        RECORD.pack_into(
+            self.buffer, (self.head % self.capacity) * RECORD.size, *record)
+        self.head += 1
+        if self.head - self.tail >= self.block_records:
+            self._wake.set()
+
+    def stop(self) -> None:
+        """Write out everything recorded and close the file"""
+        if self._thread is None:
+            return
+        self._stop_event.set()
+        self._wake.set()
+        clock.join(self._thread)
+        self._thread = None
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        if self.dropped:
+            print('[!] Telemetry dropped {} records'.format(self.dropped))
+
+    def _run(self) -> None:
+        while not self._stop_event.is_set():
+            clock.wait(self._wake, self.flush_interval)
+            self._wake.clear()
+            self._flush()
+        self._flush()
+
+    def _flush(self) -> None:
+        """Write records between tail and head, at most two slices"""
+        head = self.head
+        f = self._file
+        if head == self.tail or f is None:
+            return
+        view = memoryview(self.buffer)
+        start = (self.tail % self.capacity) * RECORD.size
+        end = (head % self.capacity) * RECORD.size
+        if end > start:
+            f.write(view[start:end])
+        else:
+            f.write(view[start:])
+            f.write(view[:end])
+        f.flush()
+        self.tail = head
+
+
+def read_records(f: BinaryIO, follow: bool = False) -> Iterator[TelemetryRecord]:
+    """Decode records from a telemetry file, waiting for more if follow"""
+    header = f.read(HEADER.size)
+    if len(header) < HEADER.size:
+        raise ValueError("[!] Telemetry file is missing its header")
+    magic, version, size = HEADER.unpack(header)
+    if magic != MAGIC or version != VERSION or size != RECORD.size:
+        raise ValueError("[!] Not a version {} telemetry file".format(VERSION))
+    pending = b''
+    while True:
+        data = f.read(RECORD.size * 256)
+        if not data:
+            if not follow:
+                return
+            time.sleep(0.1)
+            continue
+        pending += data
+        whole = len(pending) - len(pending) % RECORD.size
+        for fields in RECORD.iter_unpack(pending[:whole]):
+            yield TelemetryRecord(*fields)
+        pending = pending[whole:]
+
+
+def format_record(record: TelemetryRecord) -> str:
+    """Format a record as one line of text"""
+    return (
+        '{:7d} {:10.3f} {} {} tof {:5.1f} {:5.1f} {:5.1f} {:5.1f} {:5.1f} '
+        'line {:3d} {:3d} pwm {:3d} {:3d} dir {} {} cups {} stale {:05b} '
+        'flags {:03b}'.format(
+            record.tick,
+            record.timestamp,
+            BaseState(record.base_state).name,
+            RobotState(record.robot_state).name,
+            record.left_tof,
+            record.middle_tof,
+            record.right_tof,
+            record.top_tof,
+            record.bottom_tof,
+            record.left_line,
+            record.right_line,
+            record.left_pwm,
+            record.right_pwm,
+            record.left_dir,
+            record.right_dir,
+            record.cup_net_count,
+            record.stale,
+            record.flags))
+
+
+def print_state_changes(records: Iterator[TelemetryRecord]) -> None:
+    """Print only ticks where either state machine changed state"""
+    last: Optional[TelemetryRecord] = None
+    for record in records:
+        if last is None or record.base_state != last.base_state:
+            print('{:10.3f} BASE {} -> {}'.format(
+                record.timestamp,
+                BaseState(last.base_state).name if last else '-',
+                BaseState(record.base_state).name))
+        if last is None or record.robot_state != last.robot_state:
+            print('{:10.3f} ROBOT {} -> {} (cups/nets {})'.format(
+                record.timestamp,
+                RobotState(last.robot_state).name if last else '-',
+                RobotState(record.robot_state).name,
+                record.cup_net_count))
+        last = record
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Decode a telemetry file')
+    parser.add_argument('path')
+    parser.add_argument(
+        '--changes', action='store_true', help='only print state changes')
+    parser.add_argument(
+        '--follow', action='store_true', help='keep reading as the file grows')
+    args = parser.parse_args()
+    with open(args.path, 'rb') as f:
+        records = read_records(f, args.follow)
+        try:
+            if args.changes:
+                print_state_changes(records)
+            else:
+                for record in records:
+                    print(format_record(record))
+        except (BrokenPipeError, KeyboardInterrupt):
+            sys.exit(0)
@@ -0,0 +1,21 @@
+import pytest
+
+from robot.sim.fake_hardware import FakeHardware
+from robot.utils.clock import RealClock, VirtualClock, set_clock
+
+
+@pytest.fixture(scope='session')
+def hardware() -> FakeHardware:
+    """Fake hardware libraries, installed once since modules importing
+    them keep whichever they found first"""
+    hardware = FakeHardware()
+    hardware.install()
+    return hardware
+
+
+@pytest.fixture
+def virtual_clock():
+    """Run on simulated time so moves finish without waiting"""
+    set_clock(VirtualClock())
+    yield
+    set_clock(RealClock())
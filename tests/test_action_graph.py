@@ -0,0 +1,66 @@
+import pytest
+
+from robot.utils.action_graph import ActionGraph, ActionNode
+from robot.utils.actions import Action
+
+
+class Motion:
+    """Waitable that only finishes when cancelled"""
+
+    def __init__(self) -> None:
+        self.done = False
+        self.cancelled = False
+
+    def cancel(self) -> None:
+        self.cancelled = True
+        self.done = True
+
+
+def test_branches_overlap():
+    order = []
+
+    def step(name: str, ticks: int) -> Action:
+        order.append(name)
+        for _ in range(ticks):
+            yield None
+
+    graph = ActionGraph([
+        ActionNode('first', lambda: step('first', 1)),
+        ActionNode('left', lambda: step('left', 2), after=('first',)),
+        ActionNode('right', lambda: step('right', 2), after=('first',)),
+    ])
+    steps = sum(1 for _ in graph.run(lambda: 0.0))
+    assert order == ['first', 'left', 'right']
+    assert steps == 3
+
+
+def test_failed_node_cancels_running_branches():
+    motion = Motion()
+
+    def move() -> Action:
+        yield motion
+
+    def fail() -> Action:
+        yield None
+        raise RuntimeError('jammed')
+
+    graph = ActionGraph([
+        ActionNode('move', move),
+        ActionNode('fail', fail),
+    ])
+    with pytest.raises(RuntimeError):
+        for _ in graph.run(lambda: 0.0):
+            pass
+    assert motion.cancelled
+
+
+def test_closing_graph_cancels_running_branches():
+    motion = Motion()
+
+    def move() -> Action:
+        yield motion
+
+    run = ActionGraph([ActionNode('move', move)]).run(lambda: 0.0)
+    next(run)
+    run.close()
+    assert motion.cancelled
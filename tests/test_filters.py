@@ -0,0 +1,126 @@
+import pytest
+
+from robot.utils.filters import (
+    EMAFilter,
+    Filter,
+    MedianFilter,
+    MovingAverageFilter,
+    RejectionFilter,
+    RingBuffer,
+)
+
+
+def test_filter_is_abstract():
+    with pytest.raises(TypeError):
+        Filter()  # type: ignore[abstract]
+
+
+def test_ring_buffer_evicts_oldest():
+    buffer = RingBuffer(3)
+    assert buffer.append(1) is None
+    assert buffer.append(2) is None
+    assert buffer.append(3) is None
+    assert buffer.append(4) == 1
+    assert len(buffer) == 3
+    assert buffer.total == 9
+
+
+def test_moving_average_window():
+    moving_average = MovingAverageFilter(3)
+    assert moving_average.value == 0
+    moving_average.update(3)
+    assert moving_average.value == 3
+    for value in (6, 9, 12):
+        moving_average.update(value)
+    # 3 has left the window
+    assert moving_average.value == 9
+    moving_average.reset()
+    assert moving_average.value == 0
+
+
+def test_median_ignores_spike_and_evicts():
+    median = MedianFilter(3)
+    for value in (100, 500, 102):
+        median.update(value)
+    assert median.value == 102
+    median.update(104)
+    # 100 has left the window, leaving 500, 102 and 104
+    assert median.value == 104
+    median.update(106)
+    median.update(108)
+    assert median.value == 106
+
+
+def test_median_even_count():
+    median = MedianFilter(4)
+    for value in (4, 1, 3, 2):
+        median.update(value)
+    assert median.value == 2.5
+
+
+def test_ema():
+    ema = EMAFilter(0.5)
+    assert ema.value == 0
+    ema.update(100)
+    assert ema.value == 100
+    ema.update(200)
+    assert ema.value == 150
+    ema.update(200)
+    assert ema.value == 175
+    ema.reset()
+    assert ema.value == 0
+
+
+def test_ema_alpha_range():
+    with pytest.raises(ValueError):
+        EMAFilter(0)
+    with pytest.raises(ValueError):
+        EMAFilter(1.5)
+
+
+def test_rejection_drops_invalid_samples():
+    rejection = RejectionFilter(
+        MovingAverageFilter(5),
+        max_distance=4000,
+        valid_statuses=(0,))
+    rejection.update(0)
+    rejection.update(5000)
+    rejection.update(100, status=4)
+    assert rejection.rejected == 3
+    assert rejection.value == 0
+    rejection.update(100)
+    assert rejection.value == 100
+
+
+def test_rejection_drops_single_step():
+    rejection = RejectionFilter(EMAFilter(1), max_step=50)
+    rejection.update(100)
+    rejection.update(900)
+    rejection.update(110)
+    assert rejection.value == 110
+    assert rejection.rejected == 1
+
+
+def test_rejection_follows_persistent_step():
+    rejection = RejectionFilter(
+        MovingAverageFilter(3), max_step=50, max_step_rejections=2)
+    for _ in range(3):
+        rejection.update(100)
+    for _ in range(3):
+        rejection.update(300)
+    assert rejection.rejected == 2
+    # once the step is accepted the rest of the new samples are kept
+    for _ in range(3):
+        rejection.update(300)
+    assert rejection.rejected == 2
+    assert rejection.value == 300
+
+
+def test_rejection_reset():
+    rejection = RejectionFilter(EMAFilter(1), max_step=50)
+    rejection.update(100)
+    rejection.update(900)
+    rejection.reset()
+    rejection.update(900)
+    assert rejection.value == 900
+    assert rejection.rejected == 0
@@ -0,0 +1,46 @@
+from robot.utils.persist import load_json, save_json
+
+
+def test_lost_position_homes_at_startup(
+        hardware, virtual_clock, tmp_path, monkeypatch):
+    from robot.subsystems.lift import Lift
+    from robot.utils import init
+    position_path = str(tmp_path / 'lift_position.json')
+    save_json(position_path, {'position': None})
+    monkeypatch.setattr(init, 'lift_position_path', position_path)
+    monkeypatch.setattr(
+        init, 'lift_profile_path', str(tmp_path / 'lift_profile.json'))
+    monkeypatch.setattr(
+        init, 'actuator_model_path', str(tmp_path / 'actuator_model.json'))
+    pulses_sent = hardware.pi.wave_pulses_sent
+    lift = init.init_subsystems(hardware.pi, hardware.bus)['lift']
+    assert lift.position == Lift.home_position
+    assert load_json(position_path, {})['position'] == Lift.home_position
+    # driven down the full travel, then a pulse releasing the coils
+    assert hardware.pi.wave_pulses_sent - pulses_sent == Lift.clear_position + 1
+    # and the first move of the run can be planned
+    lift.initial_rise()
+    assert lift.position == Lift.rise_position
+
+
+def test_stop_keeps_phase_when_idle(hardware, virtual_clock):
+    from robot.subsystems.lift import Lift
+    from robot.utils import init
+    lift = Lift(init.phase_a_pins, init.phase_b_pins, hardware.pi)
+    lift.move_to(Lift.rise_position + 1)
+    coil = lift.stepper.coil
+    assert coil is not None
+    lift.stop()
+    assert lift.position == Lift.rise_position + 1
+    assert lift.stepper.coil == coil
+
+
+def test_stop_during_move_loses_position(hardware, virtual_clock):
+    from robot.subsystems.lift import Lift
+    from robot.utils import init
+    lift = Lift(init.phase_a_pins, init.phase_b_pins, hardware.pi)
+    action = lift.move_to_action(Lift.rise_position)
+    next(action)
+    lift.stop()
+    assert lift.position is None
+    assert lift.stepper.coil is None